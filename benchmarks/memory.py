@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+
+"""memory benchmark.
+
+Measures the memory retained by results loaded for analysis, as plain results
+and as compact results. Result bodies are synthesized to resemble those
+returned by the API server, including its bookkeeping metadata, and each is
+decoded separately as `Client.get_result` would.
+
+Usage:
+  memory.py [--results=<n>] [--steps=<n>]
+
+Options:
+  -h --help        Show this screen.
+  --results=<n>    Number of results [default: 100000].
+  --steps=<n>      Recorded steps per result [default: 5].
+"""
+from docopt import docopt
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+# Run as `python benchmarks/<name>.py`, the repository root is not on the
+# path.
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+from lib.exp import Result  # noqa: E402
+
+
+def body(index, steps):
+    name = 'bench-{:08x}'.format(index)
+    return {
+        'apiVersion': 'ml.intel.com/v1',
+        'kind': 'Result',
+        'metadata': {
+            'name': name,
+            'namespace': 'bench',
+            'uid': str(uuid.uuid4()),
+            'resourceVersion': str(index),
+            'generation': 1,
+            'creationTimestamp': '2018-06-01T12:00:00Z',
+            'selfLink': '/apis/ml.intel.com/v1/namespaces/bench/results/' +
+                        name,
+            'labels': {'experiment': 'bench'},
+            'ownerReferences': [{
+                'apiVersion': 'ml.intel.com/v1',
+                'controller': True,
+                'kind': 'Experiment',
+                'name': 'bench',
+                'uid': 'experiment-uid',
+                'blockOwnerDeletion': True
+            }],
+            'managedFields': [{
+                'manager': 'python-requests',
+                'operation': 'Update',
+                'apiVersion': 'ml.intel.com/v1',
+                'time': '2018-06-01T12:00:00Z',
+                'fieldsType': 'FieldsV1',
+                'fieldsV1': {'f:status': {'.': {}, 'f:values': {'.': {}}}}
+            }]
+        },
+        'status': {
+            'job_parameters': {'x': index % 7, 'y': index % 2 == 0,
+                               'z': 'foo'},
+            'values': dict(('step-{}'.format(step * 10), {
+                'loss': random.random(),
+                'accuracy': random.random()
+            }) for step in range(steps))
+        }
+    }
+
+
+def measure(documents, compact):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = [Result.from_body(json.loads(document), compact=compact)
+               for document in documents]
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del results
+    return retained, elapsed
+
+
+def main():
+    args = docopt(__doc__)
+    count = int(args['--results'])
+    steps = int(args['--steps'])
+    documents = [json.dumps(body(index, steps)) for index in range(count)]
+    for name, compact in [('results', False), ('compact results', True)]:
+        retained, elapsed = measure(documents, compact)
+        print('{:<16} {:8.1f} MiB retained  {:7.0f} bytes/result  '
+              '{:6.2f} s to load'.format(name, retained / 2 ** 20,
+                                         float(retained) / count, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+
+"""result store benchmark.
+
+Measures metric write throughput of the SQLite result store with concurrent
+jobs each recording steps through `Client.update_result`, and the latency of
+a best-value-per-experiment query over everything written.
+
+Usage:
+  result_store.py [--jobs=<n>] [--steps=<n>] [--metrics=<n>]
+                  [--experiments=<n>]
+
+Options:
+  -h --help            Show this screen.
+  --jobs=<n>           Concurrent jobs [default: 16].
+  --steps=<n>          Steps recorded per job [default: 200].
+  --metrics=<n>        Metrics recorded per step [default: 4].
+  --experiments=<n>    Experiments the jobs belong to [default: 4].
+"""
+from concurrent.futures import ThreadPoolExecutor
+from docopt import docopt
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Make `lib` importable when run as a script from a checkout.
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+from lib.exp import Client, Experiment  # noqa: E402
+
+
+def main():
+    args = docopt(__doc__)
+    jobs = int(args['--jobs'])
+    steps = int(args['--steps'])
+    metrics = int(args['--metrics'])
+    experiments = [Experiment('bench-{}'.format(i), {}, meta={'uid': str(i)})
+                   for i in range(int(args['--experiments']))]
+    path = os.path.join(tempfile.mkdtemp(), 'results.db')
+    client = Client('bench', store_url='sqlite://' + path)
+
+    def job(index):
+        exp = experiments[index % len(experiments)]
+        result = client.create_result(
+            exp.result_for('{}-{}'.format(exp.name, index), {'x': index}))
+        for step in range(steps):
+            result.record_values({'step-{}'.format(step): dict(
+                ('metric-{}'.format(m), random.random())
+                for m in range(metrics))})
+            result = client.update_result(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(job, range(jobs)))
+    elapsed = time.perf_counter() - start
+    points = jobs * steps * metrics
+    print('wrote {} metric points in {:.2f} s ({:.0f} points/s)'.format(
+        points, elapsed, points / elapsed))
+
+    timings = []
+    for _ in range(20):
+        start = time.perf_counter()
+        client.store.best_values('metric-0')
+        timings.append(time.perf_counter() - start)
+    print('best value per experiment: {:.2f} ms (min of 20)'.format(
+        1000 * min(timings)))
+
+
+if __name__ == '__main__':
+    main()
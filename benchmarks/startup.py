@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+
+"""startup benchmark.
+
+Measures how long a fresh job process takes from interpreter start until it
+has written its first result. Each scenario runs in a new interpreter so that
+import costs are included. Requests go to a stub API server in this process
+that answers after `--latency` milliseconds.
+
+Usage:
+  startup.py [--runs=<n>] [--latency=<ms>]
+
+Options:
+  -h --help       Show this screen.
+  --runs=<n>      Processes to start per scenario [default: 10].
+  --latency=<ms>  Time the stub API server takes per request [default: 5].
+"""
+from docopt import docopt
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Previous job startup: reading the experiment and the job from the API before
+# creating the result.
+EAGER = '''
+from lib import load_config
+from lib.exp import Experiment
+from kubernetes import client
+load_config()
+api = client.CustomObjectsApi()
+exp = Experiment.from_body(api.get_namespaced_custom_object(
+    'ml.intel.com', 'v1', 'bench', 'experiments', 'bench'))
+job = client.BatchV1Api().read_namespaced_job('bench-00000000', 'bench')
+api.create_namespaced_custom_object(
+    'ml.intel.com', 'v1', 'bench', 'results', exp.result(job).to_body())
+'''
+
+# Current job startup, as in job.py: the experiment and job parameters come
+# from the environment, so creating the result is the only request.
+LAZY = '''
+from lib.exp import Client
+c = Client('bench')
+exp = c.current_experiment()
+c.create_result(c.current_result(exp))
+'''
+
+SCENARIOS = [('API-read spec', EAGER),
+             ('environment-delivered spec', LAZY)]
+
+SPEC = {'jobSpec': {}, 'parameters': {'x': [1, 2, 3]}}
+
+EXPERIMENT = {
+    'apiVersion': 'ml.intel.com/v1',
+    'kind': 'Experiment',
+    'metadata': {'name': 'bench', 'namespace': 'bench', 'uid': 'uid'},
+    'spec': SPEC
+}
+
+JOB = {
+    'apiVersion': 'batch/v1',
+    'kind': 'Job',
+    'metadata': {
+        'name': 'bench-00000000',
+        'namespace': 'bench',
+        'annotations': {'job_parameters': json.dumps({'x': 1})}
+    },
+    'spec': {'template': {'spec': {'containers': [
+        {'name': 'main', 'image': 'bench'}]}}}
+}
+
+
+# Answers the requests of both scenarios like the API server would.
+class StubAPIHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def _reply(self, status, body):
+        time.sleep(self.latency)
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.endswith('/experiments/bench'):
+            self._reply(200, EXPERIMENT)
+        elif self.path.endswith('/jobs/bench-00000000'):
+            self._reply(200, JOB)
+        else:
+            self._reply(404, {'kind': 'Status', 'reason': 'NotFound'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self._reply(201, json.loads(self.rfile.read(length).decode('utf-8')))
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Starts the stub API server and returns a kubeconfig pointing at it.
+def start_api(latency):
+    StubAPIHandler.latency = latency
+    server = HTTPServer(('127.0.0.1', 0), StubAPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    kubeconfig = tempfile.NamedTemporaryFile('w', suffix='.yaml',
+                                             delete=False)
+    kubeconfig.write(json.dumps({
+        'apiVersion': 'v1',
+        'kind': 'Config',
+        'clusters': [{'name': 'bench', 'cluster': {
+            'server': 'http://127.0.0.1:{}'.format(server.server_port)}}],
+        'users': [{'name': 'bench', 'user': {'username': 'bench'}}],
+        'contexts': [{'name': 'bench', 'context': {
+            'cluster': 'bench', 'user': 'bench'}}],
+        'current-context': 'bench'
+    }))
+    kubeconfig.close()
+    return kubeconfig.name
+
+
+def environment(kubeconfig):
+    spec = {
+        'metadata': EXPERIMENT['metadata'],
+        'spec': SPEC
+    }
+    env = dict(os.environ)
+    for name in ('KUBERNETES_SERVICE_HOST', 'RESULT_STORE',
+                 'EXPERIMENT_BACKEND'):
+        env.pop(name, None)
+    env.update({
+        'KUBECONFIG': kubeconfig,
+        'PYTHONPATH': ROOT,
+        'JOB_NAME': 'bench-00000000',
+        'JOB_PARAMETERS': json.dumps({'x': 1}),
+        'EXPERIMENT_NAMESPACE': 'bench',
+        'EXPERIMENT_NAME': 'bench',
+        'EXPERIMENT_SPEC': json.dumps(spec)
+    })
+    return env
+
+
+def measure(code, runs, kubeconfig):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code],
+                       env=environment(kubeconfig), check=True,
+                       stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    args = docopt(__doc__)
+    runs = int(args['--runs'])
+    kubeconfig = start_api(float(args['--latency']) / 1000)
+    for name, code in SCENARIOS:
+        timings = measure(code, runs, kubeconfig)
+        print('{:<28} median {:7.1f} ms  min {:7.1f} ms'.format(
+            name, 1000 * statistics.median(timings), 1000 * min(timings)))
+
+
+if __name__ == '__main__':
+    main()
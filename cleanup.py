@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+
+"""cleanup.
+
+Usage:
+  cleanup.py --namespace=<ns> [--experiment-name=<exp>] [--ttl=<seconds>]
+             [--archive-file=<path>] [--max-workers=<n>] [--verbose]
+
+Options:
+  -h --help                Show this screen.
+  --version                Show version.
+  --namespace=<ns>         Experiment namespace [default: default].
+  --experiment-name=<exp>  Experiment name. All experiments when omitted.
+  --ttl=<seconds>          Age after which finished jobs are collected
+                           [default: 3600].
+  --archive-file=<path>    Append result summaries to this JSON lines file
+                           instead of the experiment status.
+  --max-workers=<n>        Maximum concurrent delete requests [default: 8].
+  --verbose                Enable verbose log output.
+"""
+from docopt import docopt
+from lib.exp import Client
+from lib.retention import collect_garbage
+import logging
+
+
+LOG = None
+
+
+def main():
+    global LOG
+    # Parse arguments
+    args = docopt(__doc__, version='cleanup 0.1.0')
+
+    # Set up logging
+    LOG = logging.getLogger('cleanup')
+    logging.basicConfig(level=logging.INFO)
+    if args['--verbose']:
+        logging.basicConfig(level=logging.DEBUG)
+    LOG.debug('arguments:\n{}'.format(args))
+
+    client = Client(args['--namespace'])
+    if args['--experiment-name']:
+        experiments = [client.get_experiment(args['--experiment-name'])]
+    else:
+        experiments = client.list_experiments()
+
+    for exp in experiments:
+        collected = collect_garbage(client, exp, int(args['--ttl']),
+                                    archive_path=args['--archive-file'],
+                                    max_workers=int(args['--max-workers']))
+        LOG.info('collected {} finished jobs of experiment {}'.format(
+            len(collected), exp.name))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
-from lib.exp import Client
+from lib.exp import Client, kube
 import json
-import kubernetes
 import logging
 import os
 import random
@@ -21,9 +20,14 @@ def main():
 
     log.info('Starting job {} for experiment {}'.format(job_name, exp.name))
 
+    # Continuations of a trial receive the checkpoint to resume from.
+    checkpoint = os.getenv('CHECKPOINT_PATH')
+    if checkpoint:
+        log.info('Resuming from checkpoint {}'.format(checkpoint))
+
     try:
-        result = c.create_result(exp.result(c.get_job(job_name)))
-    except kubernetes.client.rest.ApiException as e:
+        result = c.create_result(c.current_result(exp))
+    except kube().rest.ApiException as e:
         body = json.loads(e.body)
         if body['reason'] != 'AlreadyExists':
             raise e
@@ -1,18 +1,36 @@
-from kubernetes import config
-from pkg_resources import get_distribution, DistributionNotFound
+try:
+    from importlib.metadata import version, PackageNotFoundError
+except ImportError:
+    # Python < 3.8
+    from pkg_resources import get_distribution, DistributionNotFound \
+        as PackageNotFoundError
+
+    def version(name):
+        return get_distribution(name).version
 
 
 # prep version information
 try:
     # TODO: revert to canonical import from __name__ once distribution matches
     # import name. See: https://github.com/IntelAI/experiments/issues/22
-    # __version__ = get_distribution(__name__).version
-    __version__ = get_distribution("experiments").version
-except DistributionNotFound:
+    # __version__ = version(__name__)
+    __version__ = version("experiments")
+except PackageNotFoundError:
     print("unable to determine Experiments version info")
 
-# ensure we can connect to a running cluster
-try:
-    config.load_incluster_config()
-except Exception:
-    config.load_kube_config()
+_config_loaded = False
+
+
+# Ensures we can connect to a running cluster. Called on first use of the
+# kubernetes API rather than on import, since importing the kubernetes package
+# and reading credentials delays the start of every job.
+def load_config():
+    global _config_loaded
+    if _config_loaded:
+        return
+    from kubernetes import config
+    try:
+        config.load_incluster_config()
+    except Exception:
+        config.load_kube_config()
+    _config_loaded = True
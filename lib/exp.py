@@ -1,9 +1,11 @@
-from kubernetes import client
 from collections import namedtuple
+from lib import load_config, ratelimit
 import copy
 import json
 import logging
 import os
+import re
+import sys
 import time
 import uuid
 import yaml
@@ -16,26 +18,142 @@ EXPERIMENTS = "experiments"
 RESULT = "result"
 RESULTS = "results"
 
+# Jobs record per-step metrics in their result values like:
+#
+# {"step-10": {"loss": 0.3, "accuracy": 0.8}, "step-20": {...}}
+STEP = re.compile(r'^step-(\d+)$')
+
+# Backends that jobs created through `Client.create_job` can run on.
+KUBERNETES = 'kubernetes'
+LOCAL = 'local'
+
 LOG = logging.getLogger(__name__)
 
 
+# Returns the kubernetes client package. It is imported on first use rather
+# than with this module since the import alone takes a large share of a short
+# job's startup time.
+def kube():
+    from kubernetes import client
+    return client
+
+
+# Returns an API error like those raised by the kubernetes client, for
+# backends that do not talk to the API server.
+def api_exception(status, reason, message):
+    e = kube().rest.ApiException(status=status, reason=reason)
+    # Mirror the body of a kube API error so callers can inspect `reason`.
+    e.body = json.dumps({
+        'kind': 'Status',
+        'status': 'Failure',
+        'reason': reason,
+        'message': message,
+        'code': status
+    })
+    return e
+
+
 def deserialize_object(serialized_bytes, class_name):
     # Necessary to get access to request body deserialization methods.
-    api_client = client.ApiClient()
+    api_client = kube().ApiClient()
     Response = namedtuple('Response', ['data'])
     body = Response(serialized_bytes)
     return api_client.deserialize(body, class_name)
 
 
 # Simple Experiments API wrapper for kube client
+#
+# `backend` selects where jobs run and objects are stored: `kubernetes` (the
+# default) or `local`, which runs jobs as subprocesses and keeps experiments
+# and results in a file-backed store (see `lib.local`). When omitted it is
+# read from the EXPERIMENT_BACKEND environment variable, which local jobs
+# inherit. `context` names a kubeconfig context to talk to instead of the
+# current one.
+#
+# Results are kept in a result store, see `lib.store`: either the supplied
+# `store`, or the one `store_url` (or else the RESULT_STORE environment
+# variable) points at. Results are custom resources by default.
+#
+# The kubernetes API objects are created on first use, so constructing a
+# client is cheap.
+#
+# Requests to the API server share the process-wide rate limiter of its
+# context, see `lib.ratelimit`, so that every client in a process stays under
+# one quota.
 class Client(object):
-    def __init__(self, namespace='default'):
+    def __init__(self, namespace='default', backend=None, context=None,
+                 store=None, store_url=None):
         self.namespace = namespace
-        self.k8s = client.CustomObjectsApi()
-        self.batch = client.BatchV1Api()
+        self.context = context
+        self.backend = backend or os.getenv('EXPERIMENT_BACKEND', KUBERNETES)
+        self._api_client = None
+        self._k8s = None
+        self._batch = None
+        self._core = None
+        self._limiter = None
+        self._store = store
+        self.store_url = store_url
+        if store is None and store_url is None:
+            self.store_url = os.getenv('RESULT_STORE')
+        if self.store_url and self.store_url.startswith('sqlite://'):
+            # Jobs inherit the URL but may run in another directory.
+            self.store_url = 'sqlite://' + os.path.abspath(
+                self.store_url[len('sqlite://'):])
+        if self.backend == LOCAL:
+            from lib import local
+            executor = local.executor()
+            self._k8s = executor.store
+            self._batch = executor
+            self._core = executor
+        elif self.backend != KUBERNETES:
+            raise Exception('Unknown backend {}'.format(self.backend))
+
+    def _kube_api_client(self):
+        if self._api_client is None:
+            if self.context is not None:
+                from kubernetes import config
+                self._api_client = config.new_client_from_config(
+                    context=self.context)
+            else:
+                load_config()
+                self._api_client = kube().ApiClient()
+        return self._api_client
+
+    @property
+    def k8s(self):
+        if self._k8s is None:
+            self._k8s = kube().CustomObjectsApi(self._kube_api_client())
+        return self._k8s
+
+    @property
+    def batch(self):
+        if self._batch is None:
+            self._batch = kube().BatchV1Api(self._kube_api_client())
+        return self._batch
+
+    # The rate limiter of this client's API server, or None for the local
+    # backend.
+    @property
+    def limiter(self):
+        if self._limiter is None and self.backend == KUBERNETES:
+            self._limiter = ratelimit.limiter(self.context)
+        return self._limiter
+
+    @property
+    def store(self):
+        if self._store is None:
+            from lib import store
+            self._store = store.from_url(self.store_url, self)
+        return self._store
+
+    @property
+    def core(self):
+        if self._core is None:
+            self._core = kube().CoreV1Api(self._kube_api_client())
+        return self._core
 
     def _retry_poll_api(self, api, max_retries_error, max_retries=30,
-                        retry_interval=1, api_kwargs={}):
+                        retry_interval=1, api_kwargs={}, priority=None):
         """
         Helper function that has a polling loop to retry calling the specified
         API until it's successful (the client does not throw an Api Exception).
@@ -47,6 +165,9 @@ class Client(object):
         :param retry_interval: Number of seconds to wait between API retries
         :param api_kwargs: Dictionary of arguments to pass to the Kubernetes
         Client API function.
+        :param priority: Priority class of the request in `lib.ratelimit`.
+                         Every attempt waits for the API rate limit unless
+                         it is None.
         :return: Return value of the client API call
         """
 
@@ -56,9 +177,11 @@ class Client(object):
 
         retry_count = 0
         while retry_count < max_retries:
+            if priority is not None and self.limiter is not None:
+                self.limiter.acquire(priority)
             try:
                 return api(**api_kwargs)
-            except client.rest.ApiException:
+            except kube().rest.ApiException:
                 time.sleep(retry_interval)
                 retry_count += 1
 
@@ -74,8 +197,12 @@ class Client(object):
     # Type Definitions
 
     def create_crds(self):
+        if self.backend == LOCAL:
+            # The local store accepts any kind of object.
+            return
+
         # API Extensions V1 beta1 API client.
-        crd_api = client.ApiextensionsV1beta1Api()
+        crd_api = kube().ApiextensionsV1beta1Api(self._kube_api_client())
 
         crd_dir = os.path.join(os.path.dirname(__file__), '../resources/crds')
         crd_paths = [os.path.abspath(os.path.join(crd_dir, name))
@@ -94,7 +221,14 @@ class Client(object):
 
     # Experiments
 
+    # Returns the experiment of the job this process runs in. Jobs created by
+    # `create_job` receive the experiment in EXPERIMENT_SPEC, as it was when
+    # the job was created, which saves a request at startup. Its metadata is
+    # limited to the name, namespace and uid.
     def current_experiment(self):
+        spec = os.getenv('EXPERIMENT_SPEC')
+        if spec:
+            return Experiment.from_body(json.loads(spec))
         exp_name = os.getenv('EXPERIMENT_NAME')
         if not exp_name:
             raise Exception('Environment variable EXPERIMENT_NAME not set')
@@ -111,7 +245,8 @@ class Client(object):
                 "version": API_VERSION,
                 "namespace": self.namespace,
                 "plural": EXPERIMENTS
-            })
+            },
+            priority=ratelimit.LIST)
 
         return [Experiment.from_body(item) for item in response['items']]
 
@@ -127,7 +262,8 @@ class Client(object):
                 "namespace": self.namespace,
                 "plural": EXPERIMENTS,
                 "name": name
-            })
+            },
+            priority=ratelimit.GET)
         return Experiment.from_body(response)
 
     def create_experiment(self, exp):
@@ -141,7 +277,8 @@ class Client(object):
                 "namespace": self.namespace,
                 "plural": EXPERIMENTS,
                 "body": exp.to_body()
-            })
+            },
+            priority=ratelimit.WRITE)
         return Experiment.from_body(response)
 
     def update_experiment(self, exp):
@@ -157,7 +294,8 @@ class Client(object):
                 "plural": EXPERIMENTS,
                 "name": exp.name,
                 "body": exp.to_body()
-            })
+            },
+            priority=ratelimit.WRITE)
         return Experiment.from_body(response)
 
     def delete_experiment(self, name):
@@ -172,84 +310,50 @@ class Client(object):
                 "namespace": self.namespace,
                 "plural": EXPERIMENTS,
                 "name": name,
-                "body": client.models.V1DeleteOptions()
-            })
+                "body": kube().models.V1DeleteOptions()
+            },
+            priority=ratelimit.WRITE)
 
     # Experiment Results
 
-    def list_results(self):
-        max_retries_error = ("Maximum retries reached when listing results "
-                             "in namespace {}.".format(self.namespace))
-        response = self._retry_poll_api(
-            self.k8s.list_namespaced_custom_object, max_retries_error,
-            api_kwargs={
-                "group": API,
-                "version": API_VERSION,
-                "namespace": self.namespace,
-                "plural": RESULTS
-            })
-        return [Result.from_body(item) for item in response['items']]
+    # Lists results in the namespace. Supplying an experiment restricts the
+    # listing to that experiment's results. Large listings can be held as
+    # compact results, see `Result.from_body`.
+    def list_results(self, experiment=None, compact=False):
+        return self.store.list_results(experiment, compact)
 
     def get_result(self, name):
-        max_retries_error = ("Maximum retries reached when checking for "
-                             "result {} in namespace {}.".format(
-                              name, self.namespace))
-        response = self._retry_poll_api(
-            self.k8s.get_namespaced_custom_object, max_retries_error,
-            api_kwargs={
-                "group": API,
-                "version": API_VERSION,
-                "namespace": self.namespace,
-                "plural": RESULTS,
-                "name": name
-            })
-        return Result.from_body(response)
+        return self.store.get_result(name)
+
+    # Returns a new result for the job this process runs in, built from the
+    # JOB_NAME and JOB_PARAMETERS environment variables when available instead
+    # of reading the job. The result is not created yet.
+    def current_result(self, experiment):
+        job_name = os.getenv('JOB_NAME')
+        if not job_name:
+            raise Exception('Environment variable JOB_NAME not set')
+        parameters = os.getenv('JOB_PARAMETERS')
+        if parameters is None:
+            return experiment.result(self.get_job(job_name))
+        return experiment.result_for(job_name, json.loads(parameters),
+                                     parent=os.getenv('PARENT_RESULT'))
+
+    # Returns the named result preceded by the results it continues, oldest
+    # first.
+    def get_lineage(self, name):
+        lineage = [self.get_result(name)]
+        while lineage[0].parent():
+            lineage.insert(0, self.get_result(lineage[0].parent()))
+        return lineage
 
     def create_result(self, result):
-        max_retries_error = ("Maximum retries reached when creating result "
-                             "in namespace {}.".format(self.namespace))
-        response = self._retry_poll_api(
-            self.k8s.create_namespaced_custom_object, max_retries_error,
-            api_kwargs={
-                "group": API,
-                "version": API_VERSION,
-                "namespace": self.namespace,
-                "plural": RESULTS,
-                "body": result.to_body()
-            })
-        return Result.from_body(response)
+        return self.store.create_result(result)
 
     def update_result(self, result):
-        max_retries_error = ("Maximum retries reached when updating result {} "
-                             "in namespace {}.".format(
-                              result.name, self.namespace))
-        response = self._retry_poll_api(
-            self.k8s.replace_namespaced_custom_object, max_retries_error,
-            api_kwargs={
-                "group": API,
-                "version": API_VERSION,
-                "namespace": self.namespace,
-                "plural": RESULTS,
-                "name": result.name,
-                "body": result.to_body()
-            })
-
-        return Result.from_body(response)
+        return self.store.update_result(result)
 
     def delete_result(self, name):
-        max_retries_error = ("Maximum retries reached when deleting result {} "
-                             "in namespace {}.".format(
-                              name, self.namespace))
-        return self._retry_poll_api(
-            self.k8s.delete_namespaced_custom_object, max_retries_error,
-            api_kwargs={
-                "group": API,
-                "version": API_VERSION,
-                "namespace": self.namespace,
-                "plural": RESULTS,
-                "name": name,
-                "body": client.models.V1DeleteOptions()
-            })
+        return self.store.delete_result(name)
 
     def list_jobs(self, experiment):
         max_retries_error = ("Maximum retries reached when listing jobs in "
@@ -260,7 +364,21 @@ class Client(object):
             api_kwargs={
                 "namespace": self.namespace,
                 "label_selector": 'experiment_uid={}'.format(experiment.uid())
-            }).items
+            },
+            priority=ratelimit.LIST).items
+
+    # Lists the pods of an experiment's jobs.
+    def list_pods(self, experiment):
+        max_retries_error = ("Maximum retries reached when listing pods in "
+                             "namespace {}.".format(
+                              self.namespace))
+        return self._retry_poll_api(
+            self.core.list_namespaced_pod, max_retries_error,
+            api_kwargs={
+                "namespace": self.namespace,
+                "label_selector": 'experiment_uid={}'.format(experiment.uid())
+            },
+            priority=ratelimit.LIST).items
 
     def get_job(self, job_name):
         max_retries_error = ("Maximum retries reached when checking for "
@@ -271,9 +389,33 @@ class Client(object):
             api_kwargs={
                 "name": job_name,
                 "namespace": self.namespace
-            })
+            },
+            priority=ratelimit.GET)
+
+    def delete_job(self, job_name):
+        max_retries_error = ("Maximum retries reached when deleting job {} in "
+                             "namespace {}.".format(
+                              job_name, self.namespace))
+        # Background propagation also removes the job's pods.
+        return self._retry_poll_api(
+            self.batch.delete_namespaced_job, max_retries_error,
+            api_kwargs={
+                "name": job_name,
+                "namespace": self.namespace,
+                "body": kube().models.V1DeleteOptions(
+                    propagation_policy='Background')
+            },
+            priority=ratelimit.WRITE)
+
+    # Creates a job for a point of the experiment. Supplying a `parent` result
+    # instead continues that trial: the job receives the parent's name and
+    # checkpoint location in PARENT_RESULT and CHECKPOINT_PATH, and its
+    # result records the parent.
+    def create_job(self, experiment, parameters, parent=None):
+        if parent is not None and not parent.checkpoint():
+            raise Exception('Result {} has no checkpoint to continue '
+                            'from'.format(parent.name))
 
-    def create_job(self, experiment, parameters):
         short_uuid = str(uuid.uuid4())[:8]
         metadata = {
             'name': "{}-{}".format(experiment.name, short_uuid),
@@ -296,9 +438,17 @@ class Client(object):
             ]
         }
         job_name = metadata['name']
+        if parent is not None:
+            metadata['annotations']['parent_result'] = parent.name
 
         template = copy.deepcopy(experiment.job_template)
 
+        # Label the pods too, so that they can be listed per experiment.
+        if isinstance(template.get('template'), dict):
+            pod_metadata = template['template'].setdefault('metadata', {})
+            pod_labels = pod_metadata.setdefault('labels', {})
+            pod_labels.update(metadata['labels'])
+
         containers = None
         if 'template' in template and \
            'spec' in template['template'] and \
@@ -310,12 +460,32 @@ class Client(object):
             raise Exception(
                 "Container templates are not available in experiment job")
 
+        # The experiment spec and job parameters let the job start without
+        # reading its experiment or job from the API.
+        spec = {
+            'metadata': {
+                'name': experiment.name,
+                'namespace': self.namespace,
+                'uid': experiment.uid()
+            },
+            'spec': experiment.spec()
+        }
         experiment_environment_metadata = [
             {'name': 'JOB_NAME', 'value': job_name},
+            {'name': 'JOB_PARAMETERS', 'value': json.dumps(parameters)},
             {'name': 'EXPERIMENT_NAMESPACE', 'value': self.namespace},
             {'name': 'EXPERIMENT_NAME', 'value': experiment.name},
-            {'name': 'EXPERIMENT_UID', 'value': experiment.uid()}
+            {'name': 'EXPERIMENT_UID', 'value': experiment.uid()},
+            {'name': 'EXPERIMENT_SPEC', 'value': json.dumps(spec)}
         ]
+        if self.store_url:
+            experiment_environment_metadata.append(
+                {'name': 'RESULT_STORE', 'value': self.store_url})
+        if parent is not None:
+            experiment_environment_metadata.extend([
+                {'name': 'PARENT_RESULT', 'value': parent.name},
+                {'name': 'CHECKPOINT_PATH', 'value': parent.checkpoint()}
+            ])
 
         # Provide parameters in environment variables, encoded like:
         # PARAMETER_X_FLOAT = "3.14"
@@ -338,7 +508,7 @@ class Client(object):
 
             container['env'].extend(experiment_environment_metadata)
 
-        job = client.models.V1Job(
+        job = kube().models.V1Job(
             api_version='batch/v1',
             kind='Job',
             metadata=metadata,
@@ -352,25 +522,70 @@ class Client(object):
             api_kwargs={
                 "namespace": self.namespace,
                 "body": job
-            })
-
-
+            },
+            priority=ratelimit.WRITE)
+
+
+# Metadata that the API server maintains for its own bookkeeping. Dropped
+# from compact objects, see `Result.from_body`.
+BOOKKEEPING_METADATA = ('managedFields', 'selfLink')
+BOOKKEEPING_ANNOTATIONS = (
+    'kubectl.kubernetes.io/last-applied-configuration',)
+
+
+# Returns a copy of `metadata` without the API server's bookkeeping fields.
+def strip_metadata(metadata):
+    stripped = dict((key, value) for key, value in metadata.items()
+                    if key not in BOOKKEEPING_METADATA)
+    annotations = stripped.get('annotations')
+    if annotations:
+        annotations = dict((key, value) for key, value in annotations.items()
+                           if key not in BOOKKEEPING_ANNOTATIONS)
+        if annotations:
+            stripped['annotations'] = annotations
+        else:
+            del stripped['annotations']
+    return stripped
+
+
+# Returns a copy of `value` whose map keys are interned, so that the keys
+# repeated across many results (metric names, steps, parameter names) are
+# stored once.
+def intern_keys(value):
+    if isinstance(value, dict):
+        return dict((sys.intern(key) if isinstance(key, str) else key,
+                     intern_keys(item))
+                    for key, item in value.items())
+    if isinstance(value, list):
+        return [intern_keys(item) for item in value]
+    return value
+
+
+# `parameters` and `constraints` describe the parameter space, see
+# `lib.space`.
 class Experiment(object):
+    __slots__ = ('name', 'job_template', 'parameters', 'status', 'meta',
+                 'constraints')
+
     def __init__(self,
                  name,
                  job_template,
                  parameters=None,
                  status=None,
-                 meta=None):
+                 meta=None,
+                 constraints=None):
         if not parameters:
             parameters = {}
         if not status:
             status = {}
         if not meta:
             meta = {}
+        if not constraints:
+            constraints = []
         self.name = name
         self.job_template = job_template
         self.parameters = parameters
+        self.constraints = constraints
         self.status = status
         self.meta = meta
         self.meta['name'] = self.name
@@ -378,30 +593,47 @@ class Experiment(object):
     def uid(self):
         return self.meta.get('uid')
 
+    def spec(self):
+        spec = {
+            'jobSpec': self.job_template,
+            'parameters': self.parameters
+        }
+        if self.constraints:
+            spec['constraints'] = self.constraints
+        return spec
+
     def to_body(self):
         return {
             'apiVersion': "{}/{}".format(API, API_VERSION),
             'kind': EXPERIMENT.title(),
             'metadata': self.meta,
-            'spec': {
-                'jobSpec': self.job_template,
-                'parameters': self.parameters
-            },
+            'spec': self.spec(),
             'status': self.status
         }
 
     def result(self, job):
-        status = {}
-
-        if not isinstance(job, client.models.V1Job):
+        if not isinstance(job, kube().models.V1Job):
             raise TypeError("job parameter must be a V1Job object.")
 
+        job_parameters = None
         if 'job_parameters' in job.metadata.annotations:
-            status['job_parameters'] = json.loads(
+            job_parameters = json.loads(
                 job.metadata.annotations['job_parameters'])
 
+        return self.result_for(job.metadata.name, job_parameters,
+                               job.metadata.annotations.get('parent_result'))
+
+    # Returns a new result for the named job of this experiment. `parent`
+    # names the result the job continues, if any.
+    def result_for(self, job_name, job_parameters=None, parent=None):
+        status = {}
+        if job_parameters is not None:
+            status['job_parameters'] = job_parameters
+        if parent:
+            status['parent'] = parent
+
         return Result(
-            job.metadata.name,
+            job_name,
             self.name,
             self.uid(),
             status=status
@@ -409,14 +641,20 @@ class Experiment(object):
 
     @staticmethod
     def from_body(body):
-        return Experiment(body['metadata']['name'],
+        meta = body['metadata']
+        return Experiment(meta['name'],
                           body.get('spec', {}).get('jobSpec'),
                           body.get('spec', {}).get('parameters'),
-                          meta=body['metadata'],
-                          status=body.get('status', {}))
+                          meta=meta,
+                          status=body.get('status', {}),
+                          constraints=body.get('spec', {}).get('constraints'))
 
 
 class Result(object):
+    # Compact results keep their metadata serialized in `_raw_meta` until it
+    # is first accessed, see `from_body`.
+    __slots__ = ('name', 'status', '_meta', '_raw_meta')
+
     def __init__(self, name, exp_name, exp_uid, status=None, meta=None):
         if not status:
             status = {}
@@ -424,7 +662,8 @@ class Result(object):
             meta = {}
 
         self.name = name
-        self.meta = meta
+        self._meta = meta
+        self._raw_meta = None
         self.status = status
         self.meta['name'] = self.name
         self.meta['ownerReferences'] = [
@@ -441,12 +680,46 @@ class Result(object):
         labels['experiment'] = exp_name
         self.meta['labels'] = labels
 
+    @property
+    def meta(self):
+        if self._meta is None:
+            meta = json.loads(self._raw_meta)
+            # Results of an experiment share their labels.
+            if 'labels' in meta:
+                meta['labels'] = dict(
+                    (sys.intern(key), sys.intern(value))
+                    for key, value in meta['labels'].items())
+            self._meta = meta
+            self._raw_meta = None
+        return self._meta
+
+    @meta.setter
+    def meta(self, meta):
+        self._meta = meta
+        self._raw_meta = None
+
     def values(self):
         return self.status.get('values', {})
 
     def job_parameters(self):
         return self.status.get('job_parameters', {})
 
+    # Metrics of the latest recorded step and the number of steps, see
+    # `latest_step`.
+    def latest_step(self):
+        return latest_step(self.values())
+
+    # Name of the result this one continues from, if any.
+    def parent(self):
+        return self.status.get('parent')
+
+    # Location of the trial's latest checkpoint, if it recorded one.
+    def checkpoint(self):
+        return self.status.get('checkpoint')
+
+    def record_checkpoint(self, location):
+        self.status['checkpoint'] = location
+
     # extends `.status.values` with the supplied map
     def record_values(self, new_values):
         old_values = self.status.get('values', {})
@@ -461,10 +734,46 @@ class Result(object):
             'status': self.status
         }
 
+    # Holding many results for analysis is dominated by their metadata, which
+    # is rarely needed. With `compact`, the API server's bookkeeping metadata
+    # is dropped, the remaining metadata is kept as a JSON string that is
+    # parsed on first access to `meta`, and the keys of `status` and the labels
+    # are interned.
     @staticmethod
-    def from_body(body):
-        return Result(body['metadata']['name'],
-                      body['metadata']['ownerReferences'][0]['name'],
-                      body['metadata']['ownerReferences'][0]['uid'],
-                      meta=body['metadata'],
-                      status=body.get('status', {}))
+    def from_body(body, compact=False):
+        if not compact:
+            return Result(body['metadata']['name'],
+                          body['metadata']['ownerReferences'][0]['name'],
+                          body['metadata']['ownerReferences'][0]['uid'],
+                          meta=body['metadata'],
+                          status=body.get('status', {}))
+
+        result = Result.__new__(Result)
+        result.name = body['metadata']['name']
+        result.status = intern_keys(body.get('status', {}))
+        result._meta = None
+        result._raw_meta = json.dumps(strip_metadata(body['metadata']),
+                                      separators=(',', ':'))
+        return result
+
+
+# Returns the metrics of the latest step recorded in `values`, and the number
+# of steps recorded.
+def latest_step(values):
+    steps = []
+    for key, metrics in values.items():
+        match = STEP.match(key)
+        if match and isinstance(metrics, dict):
+            steps.append((int(match.group(1)), metrics))
+    if not steps:
+        return None, 0
+    return max(steps, key=lambda step: step[0])[1], len(steps)
+
+
+# Merges the values of a lineage, oldest first, into the history of the whole
+# trial. Later results take precedence for values recorded more than once.
+def stitch_values(lineage):
+    values = {}
+    for result in lineage:
+        values.update(result.values())
+    return values
@@ -0,0 +1,220 @@
+from datetime import datetime, timedelta, timezone
+from lib.retention import finished_at
+import json
+import logging
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+# Reasons a job failed.
+OOM_KILLED = 'OOMKilled'
+EVICTED = 'Evicted'
+PREEMPTED = 'Preempted'
+NODE_LOST = 'NodeLost'
+IMAGE_PULL = 'ImagePull'
+DEADLINE_EXCEEDED = 'DeadlineExceeded'
+APPLICATION = 'ApplicationError'
+UNKNOWN = 'Unknown'
+
+# Failures caused by the cluster rather than the job, which a new job with
+# the same parameters is expected to get past.
+TRANSIENT = (EVICTED, PREEMPTED, NODE_LOST)
+
+# The kubelet keeps retrying pulls that fail with ErrImagePull, backing off
+# with ImagePullBackOff in between, so only the latter and reasons that no
+# retry fixes count.
+IMAGE_PULL_REASONS = ('ImagePullBackOff', 'InvalidImageName',
+                      'ErrImageNeverPull')
+# Seconds after its creation a pod that is failing to pull its image fails
+# its job.
+IMAGE_PULL_GRACE = 300
+# Reasons of a pod's DisruptionTarget condition set by the scheduler.
+PREEMPTION_REASONS = ('PreemptionByScheduler', 'PreemptionByKubeScheduler')
+NODE_LOST_REASONS = ('NodeLost', 'Shutdown', 'Terminated', 'NodeShutdown')
+
+
+# Returns the reason a pod failed or is failing to start, or None if nothing
+# is wrong with it.
+def classify_pod(pod):
+    status = pod.status
+    if status is None:
+        return None
+    for condition in status.conditions or []:
+        if condition.type == 'DisruptionTarget' and \
+           condition.status == 'True':
+            if condition.reason in PREEMPTION_REASONS:
+                return PREEMPTED
+            return EVICTED
+    if status.reason == 'Evicted':
+        return EVICTED
+    if status.reason in NODE_LOST_REASONS:
+        return NODE_LOST
+
+    exited = False
+    for container in ((status.init_container_statuses or []) +
+                      (status.container_statuses or [])):
+        for state in (container.state, container.last_state):
+            if state is None:
+                continue
+            if state.waiting is not None and \
+               state.waiting.reason in IMAGE_PULL_REASONS:
+                return IMAGE_PULL
+            if state.terminated is not None:
+                if state.terminated.reason == 'OOMKilled':
+                    return OOM_KILLED
+                exited = exited or bool(state.terminated.exit_code)
+    if exited or status.phase == 'Failed':
+        return APPLICATION
+    return None
+
+
+# Returns the reason a job failed, from its conditions and the pods it ran.
+# Returns None while the job has not failed, except for jobs whose pods have
+# all been failing to pull their image for `image_pull_grace` seconds, which
+# never fail by themselves. Without pods, as on the local backend or once the
+# pods are gone, failures that exhausted the job's retries are taken for
+# application errors.
+def classify_job(job, pods, now=None, image_pull_grace=IMAGE_PULL_GRACE):
+    failed = None
+    if job.status is not None:
+        for condition in job.status.conditions or []:
+            if condition.type == 'Failed' and condition.status == 'True':
+                failed = condition
+    if failed is None:
+        if now is None:
+            now = datetime.now(timezone.utc)
+        grace = timedelta(seconds=image_pull_grace)
+        if pods and all(classify_pod(pod) == IMAGE_PULL and
+                        pod.metadata.creation_timestamp is not None and
+                        now - pod.metadata.creation_timestamp >= grace
+                        for pod in pods):
+            return IMAGE_PULL
+        return None
+    if failed.reason == 'DeadlineExceeded':
+        return DEADLINE_EXCEEDED
+
+    # The latest pod tells why the job gave up.
+    pods = sorted(pods, key=lambda pod: pod.metadata.creation_timestamp or
+                  datetime.min.replace(tzinfo=timezone.utc))
+    reasons = [reason for reason in map(classify_pod, pods)
+               if reason is not None]
+    if reasons:
+        return reasons[-1]
+    if failed.reason == 'BackoffLimitExceeded':
+        return APPLICATION
+    return UNKNOWN
+
+
+# Seconds from a job's start until it finished, or until `now` while it runs.
+def run_seconds(job, now=None):
+    status = job.status
+    start = (status.start_time if status is not None else None) or \
+        job.metadata.creation_timestamp
+    if start is None:
+        return 0.0
+    end = finished_at(job) or now or datetime.now(timezone.utc)
+    return max((end - start).total_seconds(), 0.0)
+
+
+# Watches the jobs of an experiment until they finish.
+#
+# Failed jobs are classified with `classify_job`. Those that failed for a
+# transient reason are replaced by a new job with the same parameters, until
+# the point has been attempted `max_attempts` times. Failed jobs are kept;
+# only jobs that are stuck pulling their image are deleted, as they would
+# otherwise hold their slot for ever. `report` counts the failures, retries
+# and run time lost per reason.
+class FailureWatcher(object):
+    def __init__(self, client, experiment, max_attempts=3, interval=30,
+                 image_pull_grace=IMAGE_PULL_GRACE):
+        self.client = client
+        self.experiment = experiment
+        self.max_attempts = max_attempts
+        self.interval = interval
+        self.image_pull_grace = image_pull_grace
+        # Job name to (parameters, attempt number) of jobs still running.
+        self.pending = {}
+        self.failures = {}
+        self.succeeded = 0
+
+    def watch(self, jobs):
+        for job in jobs:
+            annotations = job.metadata.annotations or {}
+            parameters = json.loads(annotations.get('job_parameters', '{}'))
+            self.pending[job.metadata.name] = (parameters, 1)
+        return self
+
+    def _record(self, reason, job, retried):
+        counts = self.failures.setdefault(reason, {
+            'jobs': 0,
+            'retried': 0,
+            'wasted_seconds': 0.0
+        })
+        counts['jobs'] += 1
+        counts['retried'] += int(retried)
+        counts['wasted_seconds'] += run_seconds(job)
+
+    def _delete(self, name):
+        try:
+            self.client.delete_job(name)
+        except Exception as e:
+            LOG.warning('unable to delete job {}: {}'.format(name, e))
+
+    # The failed job is left for `collect_garbage`, so that its pods and
+    # result remain to diagnose the failure.
+    def _retry(self, name, parameters, attempt):
+        job = self.client.create_job(self.experiment, parameters)
+        LOG.info('retrying job {} as {} (attempt {} of {})'.format(
+            name, job.metadata.name, attempt + 1, self.max_attempts))
+        self.pending[job.metadata.name] = (parameters, attempt + 1)
+
+    # Checks the pending jobs once. Returns False once none is left.
+    def step(self):
+        jobs = dict((job.metadata.name, job)
+                    for job in self.client.list_jobs(self.experiment))
+        pods = {}
+        for pod in self.client.list_pods(self.experiment):
+            labels = pod.metadata.labels or {}
+            pods.setdefault(labels.get('job-name'), []).append(pod)
+
+        for name, (parameters, attempt) in list(self.pending.items()):
+            job = jobs.get(name)
+            if job is None:
+                LOG.warning('job {} disappeared'.format(name))
+                del self.pending[name]
+                continue
+            if job.status is not None and job.status.succeeded:
+                self.succeeded += 1
+                del self.pending[name]
+                continue
+            reason = classify_job(job, pods.get(name, []),
+                                  image_pull_grace=self.image_pull_grace)
+            if reason is None:
+                continue
+            del self.pending[name]
+            retry = reason in TRANSIENT and attempt < self.max_attempts
+            LOG.warning('job {} with parameters {} failed: {}'.format(
+                name, json.dumps(parameters, sort_keys=True), reason))
+            self._record(reason, job, retry)
+            if retry:
+                self._retry(name, parameters, attempt)
+            elif finished_at(job) is None:
+                # Stuck pulling its image; free its slot.
+                self._delete(name)
+
+        return bool(self.pending)
+
+    def run(self):
+        while self.step():
+            time.sleep(self.interval)
+        return self.report()
+
+    # Returns the number of succeeded jobs and, per failure reason, the number
+    # of failed jobs, how many of them were retried and the seconds they ran.
+    def report(self):
+        return {
+            'succeeded': self.succeeded,
+            'failures': dict((reason, dict(counts))
+                             for reason, counts in self.failures.items())
+        }
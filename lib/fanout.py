@@ -0,0 +1,194 @@
+from datetime import datetime, timezone
+from lib.exp import Client, Experiment
+from lib.retention import finished_at
+import logging
+import threading
+import time
+import yaml
+
+
+LOG = logging.getLogger(__name__)
+
+# Queue latency (in seconds) that doubles the cost of placing a job on a
+# target, relative to its load.
+LATENCY_SCALE = 60.0
+
+# Weight of the newest queue latency sample in the moving average.
+LATENCY_SMOOTHING = 0.5
+
+
+# Returns how long a pod waited to be scheduled, or has been waiting so far.
+def queue_latency(pod, now=None):
+    if now is None:
+        now = datetime.now(timezone.utc)
+    created = pod.metadata.creation_timestamp
+    if created is None:
+        return None
+    for condition in (pod.status and pod.status.conditions) or []:
+        if condition.type == 'PodScheduled' and condition.status == 'True':
+            return (condition.last_transition_time - created).total_seconds()
+    return (now - created).total_seconds()
+
+
+# A namespace of some cluster that jobs of a sweep may be placed in.
+#
+# `capacity` is the number of jobs the target can run at once. The target
+# tracks how many of the experiment's jobs are outstanding there and how long
+# its pods wait to be scheduled.
+class Target(object):
+    def __init__(self, namespace, context=None, capacity=1, client=None):
+        self.namespace = namespace
+        self.context = context
+        self.capacity = max(int(capacity), 1)
+        self.client = client or Client(namespace, context=context)
+        self.experiment = None
+        self.outstanding = 0
+        self.latency = 0.0
+
+    def name(self):
+        return '{}/{}'.format(self.context or 'current', self.namespace)
+
+    # Returns this target's copy of `exp`, creating it on first use. Jobs and
+    # results are owned by the copy, so they are garbage collected with it.
+    def experiment_for(self, exp):
+        if self.experiment is None:
+            for existing in self.client.list_experiments():
+                if existing.name == exp.name:
+                    self.experiment = existing
+                    break
+            else:
+                LOG.info('creating experiment {} in {}'.format(
+                    exp.name, self.name()))
+                self.experiment = self.client.create_experiment(Experiment(
+                    exp.name, exp.job_template, exp.parameters,
+                    constraints=exp.constraints))
+        return self.experiment
+
+    # Updates the outstanding job count and queue latency from the cluster.
+    def refresh(self, exp):
+        target_exp = self.experiment_for(exp)
+        jobs = self.client.list_jobs(target_exp)
+        self.outstanding = len([job for job in jobs
+                                if finished_at(job) is None])
+        now = datetime.now(timezone.utc)
+        samples = [latency for latency in
+                   (queue_latency(pod, now)
+                    for pod in self.client.list_pods(target_exp)
+                    if pod.status is None or pod.status.phase in (
+                        'Pending', 'Running'))
+                   if latency is not None]
+        if samples:
+            sample = sum(samples) / len(samples)
+            self.latency = (LATENCY_SMOOTHING * sample +
+                            (1 - LATENCY_SMOOTHING) * self.latency)
+
+    # Cost of placing one more job here: the load the target would have,
+    # inflated by how long its pods queue before starting.
+    def cost(self):
+        load = float(self.outstanding + 1) / self.capacity
+        return load * (1 + self.latency / LATENCY_SCALE)
+
+
+# Spreads the jobs of a sweep over several targets.
+#
+# Offers the subset of `Client` used by the optimizer. Each job goes to the
+# target with the lowest cost, so targets receive work in proportion to their
+# free capacity, and targets with slow scheduling receive less. Listings
+# gather the jobs and results of every target into one view.
+class FanoutClient(object):
+    def __init__(self, targets, refresh_interval=10):
+        if not targets:
+            raise Exception('At least one target is required')
+        self.targets = targets
+        self.refresh_interval = refresh_interval
+        self._refreshed = None
+        self._lock = threading.Lock()
+        self._job_targets = {}
+
+    def _refresh(self, exp):
+        now = time.time()
+        if self._refreshed is not None and \
+           now - self._refreshed < self.refresh_interval:
+            return
+        for target in self.targets:
+            try:
+                target.refresh(exp)
+            except Exception as e:
+                LOG.warning('unable to refresh target {}: {}'.format(
+                    target.name(), e))
+        self._refreshed = now
+
+    # Jobs and their results are found on the target that listed them or
+    # that this client placed them on.
+    def _target_for_job(self, job_name):
+        target = self._job_targets.get(job_name)
+        if target is None:
+            raise Exception('Job {} was not created or listed by this '
+                            'client'.format(job_name))
+        return target
+
+    # Continuations of a result are placed on the result's target, where its
+    # checkpoint is.
+    def create_job(self, experiment, parameters, parent=None):
+        with self._lock:
+            if parent is not None:
+                target = self._target_for_job(parent.name)
+            else:
+                self._refresh(experiment)
+                target = min(self.targets, key=lambda t: t.cost())
+            target.outstanding += 1
+        job = target.client.create_job(
+            target.experiment_for(experiment), parameters, parent=parent)
+        LOG.debug('placed job {} on {}'.format(
+            job.metadata.name, target.name()))
+        self._job_targets[job.metadata.name] = target
+        return job
+
+    def get_job(self, job_name):
+        return self._target_for_job(job_name).client.get_job(job_name)
+
+    def delete_job(self, job_name):
+        return self._target_for_job(job_name).client.delete_job(job_name)
+
+    def list_jobs(self, experiment):
+        jobs = []
+        for target in self.targets:
+            for job in target.client.list_jobs(
+                    target.experiment_for(experiment)):
+                self._job_targets.setdefault(job.metadata.name, target)
+                jobs.append(job)
+        return jobs
+
+    def list_pods(self, experiment):
+        pods = []
+        for target in self.targets:
+            pods.extend(target.client.list_pods(
+                target.experiment_for(experiment)))
+        return pods
+
+    def list_results(self, experiment=None, compact=False):
+        results = []
+        for target in self.targets:
+            for result in target.client.list_results(experiment, compact):
+                self._job_targets.setdefault(result.name, target)
+                results.append(result)
+        return results
+
+    def get_result(self, name):
+        if name not in self._job_targets:
+            # Not seen yet; look for it on every target.
+            self.list_results(compact=True)
+        return self._target_for_job(name).client.get_result(name)
+
+
+# Reads targets from a YAML file holding a list of maps like:
+#
+# - namespace: sweeps
+#   context: cluster-a
+#   capacity: 64
+def load_targets(path):
+    with open(path) as targets_file:
+        specs = yaml.safe_load(targets_file)
+    return [Target(spec['namespace'], context=spec.get('context'),
+                   capacity=spec.get('capacity', 1))
+            for spec in specs]
@@ -0,0 +1,313 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from kubernetes import client
+from lib.exp import api_exception, deserialize_object
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import uuid
+
+
+LOG = logging.getLogger(__name__)
+
+# Directory holding the local object store. Child processes inherit it through
+# the environment so that they read and write the same objects.
+ROOT_ENV = 'EXPERIMENT_LOCAL_ROOT'
+DEFAULT_ROOT = os.path.join(os.path.expanduser('~'), '.experiments')
+JOBS = 'jobs'
+
+# Kubernetes' default when a job does not specify `backoffLimit`.
+DEFAULT_BACKOFF_LIMIT = 6
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+# Returns True if the object metadata matches an equality-based label selector
+# such as `experiment=foo,app=bar`.
+def _matches(metadata, label_selector):
+    if not label_selector:
+        return True
+    labels = metadata.get('labels') or {}
+    for requirement in label_selector.split(','):
+        key, _, value = requirement.partition('=')
+        if labels.get(key.strip()) != value.strip():
+            return False
+    return True
+
+
+# File-backed store offering the subset of `CustomObjectsApi` used by
+# `Client`. Objects are kept as JSON documents under
+# `<root>/<namespace>/<plural>/<name>.json`.
+class LocalObjectStore(object):
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, namespace, plural, name=None):
+        path = os.path.join(self.root, namespace, plural)
+        if name is None:
+            return path
+        return os.path.join(path, '{}.json'.format(name))
+
+    def _read(self, namespace, plural, name):
+        path = self._path(namespace, plural, name)
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise api_exception(
+                404, 'NotFound', '{} "{}" not found'.format(plural, name))
+
+    def _write(self, namespace, plural, name, body):
+        directory = self._path(namespace, plural)
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename so that readers never observe partial documents.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(body, f)
+        os.replace(tmp_path, self._path(namespace, plural, name))
+        return body
+
+    def create_namespaced_custom_object(self, group, version, namespace,
+                                        plural, body, **kwargs):
+        metadata = body.setdefault('metadata', {})
+        name = metadata['name']
+        if os.path.exists(self._path(namespace, plural, name)):
+            raise api_exception(
+                409, 'AlreadyExists',
+                '{} "{}" already exists'.format(plural, name))
+        metadata['namespace'] = namespace
+        metadata.setdefault('uid', str(uuid.uuid4()))
+        metadata['creationTimestamp'] = _now().strftime('%Y-%m-%dT%H:%M:%SZ')
+        metadata['resourceVersion'] = '1'
+        return self._write(namespace, plural, name, body)
+
+    def get_namespaced_custom_object(self, group, version, namespace, plural,
+                                     name, **kwargs):
+        return self._read(namespace, plural, name)
+
+    def list_namespaced_custom_object(self, group, version, namespace, plural,
+                                      label_selector=None, **kwargs):
+        return {'items': [item for item in self._list(namespace, plural)
+                          if _matches(item['metadata'], label_selector)]}
+
+    def _list(self, namespace, plural):
+        directory = self._path(namespace, plural)
+        if not os.path.isdir(directory):
+            return []
+        items = []
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                items.append(self._read(namespace, plural, filename[:-5]))
+            except client.rest.ApiException:
+                # Deleted while listing.
+                pass
+        return items
+
+    def replace_namespaced_custom_object(self, group, version, namespace,
+                                         plural, name, body, **kwargs):
+        current = self._read(namespace, plural, name)
+        metadata = body.setdefault('metadata', {})
+        metadata['resourceVersion'] = str(
+            int(current['metadata'].get('resourceVersion', '0')) + 1)
+        return self._write(namespace, plural, name, body)
+
+    def delete_namespaced_custom_object(self, group, version, namespace,
+                                        plural, name, body=None, **kwargs):
+        try:
+            os.remove(self._path(namespace, plural, name))
+        except FileNotFoundError:
+            raise api_exception(
+                404, 'NotFound', '{} "{}" not found'.format(plural, name))
+        return {'kind': 'Status', 'status': 'Success'}
+
+
+# Runs experiment jobs as local subprocesses instead of Kubernetes pods.
+#
+# Offers the subset of `BatchV1Api` (and `CoreV1Api`, which finds no pods)
+# used by `Client`, so that jobs created
+# through `Client.create_job` receive the same `JOB_NAME`, `EXPERIMENT_*` and
+# `PARAMETER_*` environment variables as they would in a cluster. At most
+# `max_workers` job processes run at once; the rest queue in submission order.
+class LocalExecutor(object):
+    def __init__(self, root, max_workers=None):
+        self.root = root
+        self.store = LocalObjectStore(root)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._lock = threading.Lock()
+        self._futures = []
+        self._processes = {}
+
+    def _save(self, namespace, job):
+        body = client.ApiClient().sanitize_for_serialization(job)
+        self.store._write(namespace, JOBS, job.metadata.name, body)
+
+    def _load(self, namespace, name):
+        body = self.store._read(namespace, JOBS, name)
+        return deserialize_object(json.dumps(body), 'V1Job')
+
+    def create_namespaced_job(self, namespace, body, **kwargs):
+        # Round trip through the wire format, as the API server would, since
+        # callers may supply plain dicts for nested fields.
+        job = deserialize_object(json.dumps(
+            client.ApiClient().sanitize_for_serialization(body)), 'V1Job')
+        name = job.metadata.name
+        with self._lock:
+            if os.path.exists(self.store._path(namespace, JOBS, name)):
+                raise api_exception(
+                    409, 'AlreadyExists',
+                    'jobs "{}" already exists'.format(name))
+            job.metadata.namespace = namespace
+            job.metadata.uid = str(uuid.uuid4())
+            job.metadata.creation_timestamp = _now()
+            job.status = client.models.V1JobStatus()
+            self._save(namespace, job)
+            self._futures.append(
+                self._pool.submit(self._run, namespace, name))
+        return job
+
+    def read_namespaced_job(self, name, namespace, **kwargs):
+        return self._load(namespace, name)
+
+    def list_namespaced_job(self, namespace, label_selector=None, **kwargs):
+        items = [deserialize_object(json.dumps(body), 'V1Job')
+                 for body in self.store._list(namespace, JOBS)
+                 if _matches(body['metadata'], label_selector)]
+        return client.models.V1JobList(items=items)
+
+    def delete_namespaced_job(self, name, namespace, body=None, **kwargs):
+        with self._lock:
+            for process in self._processes.pop((namespace, name), []):
+                process.terminate()
+            try:
+                os.remove(self.store._path(namespace, JOBS, name))
+            except FileNotFoundError:
+                raise api_exception(
+                    404, 'NotFound', 'jobs "{}" not found'.format(name))
+        return client.models.V1Status(status='Success')
+
+    # Local jobs have no pods.
+    def list_namespaced_pod(self, namespace, label_selector=None, **kwargs):
+        return client.models.V1PodList(items=[])
+
+    # Blocks until every submitted job has finished.
+    def wait(self):
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.result()
+
+    def _update_status(self, namespace, name, **fields):
+        with self._lock:
+            try:
+                job = self._load(namespace, name)
+            except client.rest.ApiException:
+                # The job was deleted while running.
+                return None
+            for field, value in fields.items():
+                setattr(job.status, field, value)
+            self._save(namespace, job)
+            return job
+
+    def _environment(self, container):
+        env = dict(os.environ)
+        for var in container.env or []:
+            if var.value is not None:
+                env[var.name] = var.value
+        env['EXPERIMENT_BACKEND'] = 'local'
+        env[ROOT_ENV] = self.root
+        return env
+
+    def _attempt(self, namespace, name, containers, log_file):
+        processes = []
+        for container in containers:
+            command = (container.command or []) + (container.args or [])
+            if not command:
+                raise Exception('Container {} of job {} has no command to run '
+                                'locally'.format(container.name, name))
+            cwd = container.working_dir
+            if cwd and not os.path.isdir(cwd):
+                cwd = None
+            processes.append(subprocess.Popen(
+                command, env=self._environment(container), cwd=cwd,
+                stdout=log_file, stderr=subprocess.STDOUT))
+        with self._lock:
+            self._processes[(namespace, name)] = processes
+        exit_codes = [process.wait() for process in processes]
+        with self._lock:
+            self._processes.pop((namespace, name), None)
+        return next((code for code in exit_codes if code != 0), 0)
+
+    def _run(self, namespace, name):
+        try:
+            job = self._load(namespace, name)
+        except client.rest.ApiException:
+            return
+        backoff_limit = job.spec.backoff_limit
+        if backoff_limit is None:
+            backoff_limit = DEFAULT_BACKOFF_LIMIT
+
+        log_dir = os.path.join(self.root, namespace, 'logs')
+        os.makedirs(log_dir, exist_ok=True)
+        log_path = os.path.join(log_dir, '{}.log'.format(name))
+        self._update_status(namespace, name, active=1, start_time=_now())
+
+        failed = 0
+        exit_code = None
+        with open(log_path, 'ab') as log_file:
+            while failed <= backoff_limit:
+                try:
+                    exit_code = self._attempt(
+                        namespace, name, job.spec.template.spec.containers,
+                        log_file)
+                except Exception as e:
+                    LOG.error('unable to run job {}: {}'.format(name, e))
+                    exit_code = None
+                if exit_code == 0:
+                    break
+                failed += 1
+                if exit_code is None or exit_code < 0:
+                    # Not runnable, or terminated by a signal (deleted).
+                    break
+
+        now = _now()
+        if exit_code == 0:
+            self._update_status(
+                namespace, name, active=None, succeeded=1,
+                failed=failed or None, completion_time=now,
+                conditions=[client.models.V1JobCondition(
+                    type='Complete', status='True', last_probe_time=now,
+                    last_transition_time=now)])
+            LOG.info('job {} succeeded'.format(name))
+        else:
+            self._update_status(
+                namespace, name, active=None, failed=failed,
+                conditions=[client.models.V1JobCondition(
+                    type='Failed', status='True', last_probe_time=now,
+                    last_transition_time=now, reason='BackoffLimitExceeded',
+                    message='Last attempt exited with code {}. See {}'.format(
+                        exit_code, log_path))])
+            LOG.info('job {} failed; logs in {}'.format(name, log_path))
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+# Returns the process-wide executor for `root`, creating it on first use so
+# that every `Client` in the process shares one bounded pool.
+def executor(root=None, max_workers=None):
+    if root is None:
+        root = os.getenv(ROOT_ENV, DEFAULT_ROOT)
+    root = os.path.abspath(root)
+    with _executors_lock:
+        if root not in _executors:
+            _executors[root] = LocalExecutor(root, max_workers=max_workers)
+        return _executors[root]
@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import numpy as np
+import os
+
+
+# Rows of the candidate block compared against all points at once by
+# `non_dominated`. Bounds the temporary arrays to CHUNK x n x objectives.
+CHUNK = 256
+
+MAXIMIZE = 'max'
+MINIMIZE = 'min'
+
+
+# Parses objectives written like "accuracy:max,latency:min" into a list of
+# (metric, direction) pairs.
+def parse_objectives(spec):
+    objectives = []
+    for item in spec.split(','):
+        metric, _, direction = item.strip().partition(':')
+        direction = direction or MAXIMIZE
+        if direction not in (MAXIMIZE, MINIMIZE):
+            raise Exception('Objective {} must be either max or min'.format(
+                item))
+        objectives.append((metric, direction))
+    return objectives
+
+
+# Returns the values of `objectives` that a result recorded at its latest
+# step, falling back to values recorded outside of steps. Returns None if any
+# is missing.
+def objective_values(result, objectives):
+    values = result.values()
+    metrics, _ = result.latest_step()
+    vector = []
+    for metric, _ in objectives:
+        if metrics is not None and metric in metrics:
+            vector.append(metrics[metric])
+        elif metric in values:
+            vector.append(values[metric])
+        else:
+            return None
+    return vector
+
+
+def _signs(objectives):
+    return np.array([-1.0 if direction == MAXIMIZE else 1.0
+                     for _, direction in objectives])
+
+
+# Returns a mask of the rows of `costs` (points x objectives, lower is
+# better) that no other row dominates. Blocks of rows are compared against
+# all rows in parallel.
+def non_dominated(costs, workers=None):
+    costs = np.asarray(costs, dtype=float)
+    n = len(costs)
+    mask = np.ones(n, dtype=bool)
+    if n == 0:
+        return mask
+
+    def block(start):
+        rows = costs[start:start + CHUNK, None, :]
+        dominates = (np.all(costs[None, :, :] <= rows, axis=2) &
+                     np.any(costs[None, :, :] < rows, axis=2))
+        mask[start:start + CHUNK] = ~np.any(dominates, axis=1)
+
+    starts = range(0, n, CHUNK)
+    if n <= CHUNK:
+        block(0)
+    else:
+        # NumPy releases the GIL in these element-wise kernels.
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as p:
+            list(p.map(block, starts))
+    return mask
+
+
+# Returns the non-domination rank of every row of `costs`: 0 for the Pareto
+# front, 1 for the front of the remaining rows, and so on.
+def non_dominated_sort(costs, workers=None):
+    costs = np.asarray(costs, dtype=float)
+    ranks = np.full(len(costs), -1, dtype=int)
+    remaining = np.arange(len(costs))
+    rank = 0
+    while len(remaining):
+        front = non_dominated(costs[remaining], workers)
+        ranks[remaining[front]] = rank
+        remaining = remaining[~front]
+        rank += 1
+    return ranks
+
+
+# The Pareto front of an experiment's results, maintained incrementally.
+#
+# `update` takes results as they arrive, or as their values change. A new
+# point is compared only against the current front. Only when a point on the
+# front changes is the front recomputed from every point seen.
+class ParetoFront(object):
+    def __init__(self, objectives):
+        self.objectives = objectives
+        self._signs = _signs(objectives)
+        self.results = {}
+        self._costs = {}
+        self._names = []
+        self._front = np.empty((0, len(objectives)))
+
+    def _insert(self, name, cost):
+        if len(self._front):
+            if np.any(np.all(self._front <= cost, axis=1) &
+                      np.any(self._front < cost, axis=1)):
+                return
+            keep = ~(np.all(cost <= self._front, axis=1) &
+                     np.any(cost < self._front, axis=1))
+            self._front = self._front[keep]
+            self._names = [n for n, k in zip(self._names, keep) if k]
+        self._front = np.vstack([self._front, cost])
+        self._names.append(name)
+
+    def _rebuild(self):
+        names = list(self._costs)
+        if not names:
+            self._names = []
+            self._front = np.empty((0, len(self.objectives)))
+            return
+        costs = np.array([self._costs[name] for name in names])
+        mask = non_dominated(costs)
+        self._names = [name for name, on in zip(names, mask) if on]
+        self._front = costs[mask]
+
+    def update(self, results):
+        rebuild = False
+        for result in results:
+            vector = objective_values(result, self.objectives)
+            if vector is None:
+                continue
+            cost = np.array(vector, dtype=float) * self._signs
+            previous = self._costs.get(result.name)
+            self.results[result.name] = result
+            if previous is not None and np.array_equal(previous, cost):
+                continue
+            self._costs[result.name] = cost
+            if previous is not None and result.name in self._names:
+                rebuild = True
+            elif not rebuild:
+                self._insert(result.name, cost)
+        if rebuild:
+            self._rebuild()
+        return self
+
+    # Results on the front.
+    def front(self):
+        return [self.results[name] for name in self._names]
+
+    # Objective values of the front, one row per result of `front()`.
+    def values(self):
+        return self._front * self._signs
+
+
+# Orders candidate points by their distance to the parameters of the nearest
+# result on the front, nearest first, so that new jobs explore around it.
+# Numeric parameters contribute their difference scaled by the range of the
+# parameter's values in the space; others contribute 1 if they differ.
+def prioritize(points, front, space):
+    if not points or not front:
+        return list(points)
+    columns = []
+    for parameter in space.parameters:
+        values = [v for v in parameter.values
+                  if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        if values and len(values) == len(parameter.values):
+            columns.append((parameter.name, max(values) - min(values) or 1))
+        else:
+            columns.append((parameter.name, None))
+    # Values of non-numeric parameters are compared through integer codes.
+    codes = {}
+
+    def encode(point):
+        row = []
+        for name, scale in columns:
+            if name not in point:
+                row.append(np.nan)
+            elif scale is not None:
+                row.append(point[name] / scale)
+            else:
+                key = json.dumps(point[name], sort_keys=True)
+                row.append(codes.setdefault(key, len(codes)))
+        return row
+
+    numeric = np.array([scale is not None for _, scale in columns])
+    candidates = np.array([encode(point) for point in points], dtype=float)
+    anchors = np.array([encode(result.job_parameters()) for result in front],
+                       dtype=float)
+    # candidates x anchors x parameters
+    a = candidates[:, None, :]
+    b = anchors[None, :, :]
+    distance = np.where(numeric, np.abs(a - b), (a != b).astype(float))
+    # A parameter missing on one side only counts as differing.
+    distance = np.where(np.isnan(a) & np.isnan(b), 0.0,
+                        np.where(np.isnan(distance), 1.0, distance))
+    nearest = distance.sum(axis=2).min(axis=1)
+    return [points[i] for i in np.argsort(nearest, kind='stable')]
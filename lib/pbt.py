@@ -0,0 +1,258 @@
+from lib.exp import Result
+from lib.failures import IMAGE_PULL, classify_job
+from lib.retention import finished_at
+from lib.space import ParameterSpace
+import copy
+import logging
+import os
+import random
+import shutil
+import time
+import uuid
+
+
+LOG = logging.getLogger(__name__)
+
+# Attempts at perturbing parameters into a point the experiment admits.
+EXPLORE_ATTEMPTS = 10
+
+
+# Copies the checkpoint at `location` to a new location next to it and returns
+# that location. Exploiting jobs resume from such a copy, since the job that
+# recorded the checkpoint keeps overwriting it. Only checkpoints on a
+# filesystem this process shares with the jobs can be copied; supply another
+# `copy_checkpoint` to `PopulationBasedTraining` for other storage.
+def copy_checkpoint(location):
+    if not os.path.exists(location):
+        raise Exception('Checkpoint {} is not reachable from this '
+                        'process'.format(location))
+    target = '{}-{}'.format(location.rstrip(os.sep), str(uuid.uuid4())[:8])
+    if os.path.isdir(location):
+        shutil.copytree(location, target)
+    else:
+        shutil.copy2(location, target)
+    return target
+
+
+# A slot of the population. Each slot always has one job running; when its
+# job is replaced the slot continues with the new job.
+class Member(object):
+    def __init__(self, index, parameters):
+        self.index = index
+        self.parameters = parameters
+        self.job_name = None
+        self.launches = 0
+        # Number of steps recorded by the current job at the last decision.
+        self.decided_at = 0
+        # Whether the current job has been listed, after which its absence
+        # means it is gone.
+        self.seen = False
+        self.done = False
+
+
+# Population-based training coordinator.
+#
+# Starts `population` jobs at random points of the experiment. Whenever a
+# job has recorded `ready_steps` more steps, it is ranked against the rest of
+# the population by `metric` at each job's latest step. Jobs in the bottom
+# `quantile` are stopped and replaced by a continuation of a job in the top
+# quantile (exploit), which resumes from a copy of that job's checkpoint made
+# by `copy_checkpoint`, with perturbed parameters (explore). Jobs that finish
+# are continued from their own checkpoint, so the population stays at full
+# size until each slot has been launched `max_launches` times. Jobs that
+# disappear, or that `classify_job` finds stuck pulling their image, are
+# replaced like jobs that failed.
+class PopulationBasedTraining(object):
+    def __init__(self, client, experiment, metric, mode='max',
+                 population=8, ready_steps=5, quantile=0.25,
+                 perturbations=(0.8, 1.2), resample_probability=0.25,
+                 max_launches=10, interval=30, seed=None,
+                 copy_checkpoint=copy_checkpoint):
+        if mode not in ('max', 'min'):
+            raise Exception('mode must be either max or min')
+        self.client = client
+        self.experiment = experiment
+        self.metric = metric
+        self.mode = mode
+        self.population = population
+        self.ready_steps = ready_steps
+        self.quantile = quantile
+        self.perturbations = perturbations
+        self.resample_probability = resample_probability
+        self.max_launches = max_launches
+        self.interval = interval
+        self.random = random.Random(seed)
+        self.copy_checkpoint = copy_checkpoint
+        self.space = ParameterSpace(experiment.parameters,
+                                    experiment.constraints)
+        self.members = []
+
+    def _launch(self, member, parameters, parent=None):
+        job = self.client.create_job(self.experiment, parameters,
+                                     parent=parent)
+        LOG.info('member {} launched job {} with parameters {}{}'.format(
+            member.index, job.metadata.name, parameters,
+            ' from {}'.format(parent.name) if parent else ''))
+        member.parameters = parameters
+        member.job_name = job.metadata.name
+        member.launches += 1
+        member.decided_at = 0
+        member.seen = False
+
+    def start(self):
+        points = list(self.space.points())
+        if not points:
+            raise Exception('Experiment {} has no valid points'.format(
+                self.experiment.name))
+        for index in range(self.population):
+            member = Member(index, self.random.choice(points))
+            self.members.append(member)
+            self._launch(member, member.parameters)
+
+    def _perturb(self, parameter, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            perturbed = value * self.random.choice(self.perturbations)
+            if isinstance(value, int):
+                perturbed = int(round(perturbed))
+            return perturbed
+        if self.random.random() < self.resample_probability:
+            return self.random.choice(parameter.values)
+        return value
+
+    # Returns a perturbed copy of `parameters` that the experiment admits.
+    def explore(self, parameters):
+        for _ in range(EXPLORE_ATTEMPTS):
+            point = {}
+            for parameter in self.space.parameters:
+                if not parameter.applies(point):
+                    continue
+                if parameter.name in parameters:
+                    point[parameter.name] = self._perturb(
+                        parameter, parameters[parameter.name])
+                else:
+                    point[parameter.name] = self.random.choice(
+                        parameter.values)
+            if self.space.admits(point):
+                return point
+        return dict(parameters)
+
+    # Returns members with a recorded metric, best first, paired with their
+    # results.
+    def _ranking(self, results):
+        scored = []
+        for member in self.members:
+            result = results.get(member.job_name)
+            if member.done or result is None:
+                continue
+            metrics, _ = result.latest_step()
+            if metrics is not None and self.metric in metrics:
+                scored.append((metrics[self.metric], member, result))
+        scored.sort(key=lambda score: score[0], reverse=self.mode == 'max')
+        return [(member, result) for _, member, result in scored]
+
+    # Replaces the job of `member` by a continuation of a top member. Unless
+    # `stop` is False, the job is stopped first.
+    def _exploit(self, member, ranking, stop=True):
+        cutoff = max(int(len(ranking) * self.quantile), 1)
+        top = [(m, r) for m, r in ranking[:cutoff]
+               if m is not member and r.checkpoint()]
+        if not top:
+            return False
+        source, source_result = self.random.choice(top)
+        # The continuation records the source as its parent but resumes from
+        # its own copy of the checkpoint.
+        snapshot = Result.from_body(copy.deepcopy(source_result.to_body()))
+        try:
+            snapshot.record_checkpoint(
+                self.copy_checkpoint(source_result.checkpoint()))
+        except Exception as e:
+            LOG.warning('unable to copy checkpoint of {}: {}'.format(
+                source_result.name, e))
+            return False
+        LOG.info('member {} exploits member {}'.format(
+            member.index, source.index))
+        if stop:
+            self._stop(member)
+        self._launch(member, self.explore(source.parameters),
+                     parent=snapshot)
+        return True
+
+    def _stop(self, member):
+        try:
+            self.client.delete_job(member.job_name)
+        except Exception as e:
+            LOG.warning('unable to stop job {}: {}'.format(
+                member.job_name, e))
+
+    # Launches the next job of a member whose job ended, or is None if it
+    # disappeared.
+    def _finish(self, member, job, result, ranking):
+        if member.launches >= self.max_launches:
+            LOG.info('member {} is done'.format(member.index))
+            member.done = True
+            return
+        if job is not None and job.status.succeeded and \
+           result is not None and result.checkpoint():
+            self._launch(member, member.parameters, parent=result)
+        elif not self._exploit(member, ranking, stop=False):
+            # Nothing to continue from; start over nearby.
+            self._launch(member, self.explore(member.parameters))
+
+    # Runs one round of coordination. Returns False once every member is
+    # done.
+    def step(self):
+        jobs = dict((job.metadata.name, job)
+                    for job in self.client.list_jobs(self.experiment))
+        results = dict((result.name, result)
+                       for result in self.client.list_results(
+                           self.experiment, compact=True))
+        pods = {}
+        for pod in self.client.list_pods(self.experiment):
+            labels = pod.metadata.labels or {}
+            pods.setdefault(labels.get('job-name'), []).append(pod)
+        ranking = self._ranking(results)
+        cutoff = int(len(ranking) * (1 - self.quantile))
+        bottom = set(member.index for member, _ in ranking[cutoff:])
+        if len(ranking) < 2:
+            bottom = set()
+
+        for member in self.members:
+            if member.done:
+                continue
+            job = jobs.get(member.job_name)
+            result = results.get(member.job_name)
+            if job is None:
+                if member.seen:
+                    LOG.warning('job {} of member {} disappeared'.format(
+                        member.job_name, member.index))
+                    self._finish(member, None, result, ranking)
+                continue
+            member.seen = True
+            if finished_at(job) is not None:
+                self._finish(member, job, result, ranking)
+                continue
+            if classify_job(job, pods.get(member.job_name, [])) == \
+               IMAGE_PULL:
+                LOG.warning('job {} of member {} is stuck pulling its '
+                            'image'.format(member.job_name, member.index))
+                self._stop(member)
+                self._finish(member, None, result, ranking)
+                continue
+            if result is None:
+                continue
+            _, recorded = result.latest_step()
+            if recorded - member.decided_at < self.ready_steps:
+                continue
+            member.decided_at = recorded
+            if member.index in bottom and \
+               member.launches < self.max_launches:
+                self._exploit(member, ranking)
+
+        return not all(member.done for member in self.members)
+
+    def run(self):
+        self.start()
+        while True:
+            time.sleep(self.interval)
+            if not self.step():
+                break
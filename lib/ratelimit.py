@@ -0,0 +1,132 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+# Priority classes of API requests, most urgent first. Requests of a class
+# are only sent once no request of a more urgent class is waiting.
+WRITE_RESULT = 0
+WRITE = 1
+GET = 2
+LIST = 3
+PRIORITY_NAMES = {
+    WRITE_RESULT: 'write_result',
+    WRITE: 'write',
+    GET: 'get',
+    LIST: 'list'
+}
+
+# Environment variables configuring the process-wide limiters. A rate of 0
+# disables limiting.
+QPS_ENV = 'EXPERIMENTS_API_QPS'
+BURST_ENV = 'EXPERIMENTS_API_BURST'
+DEFAULT_QPS = 20
+DEFAULT_BURST = 40
+
+# Waits longer than this are logged.
+SLOW_WAIT = 1.0
+
+
+# Holds up to `burst` tokens, refilled at `rate` tokens per second.
+class TokenBucket(object):
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(max(burst, 1))
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    # Takes a token if one is available and returns 0. Otherwise returns the
+    # number of seconds until one will be.
+    def take(self):
+        now = self.clock()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+# Hands out the tokens of a bucket to waiting requests in priority order,
+# first come first served within a priority class. Counts requests and the
+# time they waited per class, see `stats`.
+class PriorityRateLimiter(object):
+    def __init__(self, qps, burst, clock=time.monotonic):
+        self.qps = qps
+        self.bucket = TokenBucket(qps, burst, clock) if qps > 0 else None
+        self.clock = clock
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._tickets = itertools.count()
+        self._stats = dict((priority, {
+            'requests': 0,
+            'waiting': 0,
+            'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0
+        }) for priority in PRIORITY_NAMES)
+
+    # Blocks until a request of `priority` may be sent. Returns the number of
+    # seconds it waited.
+    def acquire(self, priority):
+        start = self.clock()
+        with self._condition:
+            stats = self._stats[priority]
+            if self.bucket is not None:
+                ticket = (priority, next(self._tickets))
+                heapq.heappush(self._waiting, ticket)
+                stats['waiting'] += 1
+                while True:
+                    if self._waiting[0] == ticket:
+                        delay = self.bucket.take()
+                        if delay == 0:
+                            heapq.heappop(self._waiting)
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+                stats['waiting'] -= 1
+                # Let the next request in line take its turn.
+                self._condition.notify_all()
+            waited = self.clock() - start
+            stats['requests'] += 1
+            stats['wait_seconds'] += waited
+            stats['max_wait_seconds'] = max(stats['max_wait_seconds'], waited)
+        if waited > SLOW_WAIT:
+            LOG.debug('{} request waited {:.2f}s for the API rate '
+                      'limit'.format(PRIORITY_NAMES[priority], waited))
+        return waited
+
+    # Number of requests waiting for a token.
+    def queue_depth(self):
+        with self._condition:
+            return len(self._waiting)
+
+    # Returns request counts, the number of requests waiting and the time
+    # spent waiting, per priority class name.
+    def stats(self):
+        with self._condition:
+            return dict((PRIORITY_NAMES[priority], dict(stats))
+                        for priority, stats in self._stats.items())
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+# Returns the process-wide limiter for the API server of a kubeconfig
+# `context` (None for the current one), creating it on first use so that
+# every `Client` talking to that server shares its quota.
+def limiter(context=None):
+    with _limiters_lock:
+        if context not in _limiters:
+            _limiters[context] = PriorityRateLimiter(
+                float(os.getenv(QPS_ENV, DEFAULT_QPS)),
+                int(os.getenv(BURST_ENV, DEFAULT_BURST)))
+        return _limiters[context]
@@ -0,0 +1,196 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from lib.exp import STEP, latest_step
+import json
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+# Key under an experiment's `.status` holding the summaries of results that
+# have been garbage collected.
+ARCHIVE = 'archive'
+
+# Largest serialized size of the archive kept in an experiment's status.
+# Beyond it, summaries go to a file instead, see `collect_garbage`, as the
+# experiment would outgrow the API server's object size limit.
+MAX_STATUS_ARCHIVE_BYTES = 512 * 1024
+
+# Longest string value kept in a compact summary.
+MAX_SUMMARY_STRING = 256
+
+
+# Returns the time at which a job succeeded or failed, or None if it is still
+# running.
+def finished_at(job):
+    status = job.status
+    if status is None:
+        return None
+    if status.completion_time:
+        return status.completion_time
+    for condition in status.conditions or []:
+        if condition.type in ('Complete', 'Failed') and \
+           condition.status == 'True':
+            return condition.last_transition_time
+    return None
+
+
+# Returns the time at which a result was created, or None if unknown.
+def created_at(result):
+    created = result.meta.get('creationTimestamp')
+    if not created:
+        return None
+    return datetime.strptime(created, '%Y-%m-%dT%H:%M:%SZ').replace(
+        tzinfo=timezone.utc)
+
+
+# Returns the jobs that finished more than `ttl_seconds` before `now`.
+def expired_jobs(jobs, ttl_seconds, now=None):
+    if now is None:
+        now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=ttl_seconds)
+    expired = []
+    for job in jobs:
+        finished = finished_at(job)
+        if finished is not None and finished <= cutoff:
+            expired.append(job)
+    return expired
+
+
+# Reduces values to the final value of each metric: the metrics of the latest
+# step, the number of steps, and the scalar values recorded outside of steps.
+def final_values(values):
+    final = {}
+    for key, value in values.items():
+        if STEP.match(key):
+            continue
+        if isinstance(value, (bool, int, float)) or (
+                isinstance(value, str) and len(value) <= MAX_SUMMARY_STRING):
+            final[key] = value
+    metrics, steps = latest_step(values)
+    if metrics is not None:
+        final.update(metrics)
+        final['steps'] = steps
+    return final
+
+
+# Reduces a result to the fields worth keeping once its resource is gone.
+# Unless `full`, only the final values are kept, see `final_values`.
+def summarize_result(result, full=False):
+    summary = {
+        'job_parameters': result.job_parameters(),
+        'values': result.values() if full else final_values(result.values())
+    }
+    if result.parent():
+        summary['parent'] = result.parent()
+    if result.checkpoint():
+        summary['checkpoint'] = result.checkpoint()
+    return summary
+
+
+# Folds the compact summaries of `results` into `exp.status` under `archive`,
+# keyed by result name. When `path` is supplied the full summaries are
+# appended to that file as JSON lines instead, which keeps the experiment
+# object small for very large sweeps.
+def archive_results(exp, results, path=None):
+    summaries = dict((result.name, summarize_result(result, full=bool(path)))
+                     for result in results)
+    if path is not None:
+        with open(path, 'a') as archive_file:
+            for name in sorted(summaries):
+                archive_file.write(json.dumps({
+                    'experiment': exp.name,
+                    'result': name,
+                    'summary': summaries[name]
+                }, sort_keys=True) + '\n')
+        return exp
+    archive = exp.status.get(ARCHIVE, {})
+    archive.update(summaries)
+    exp.status[ARCHIVE] = archive
+    return exp
+
+
+# Returns the serialized size the archive in `exp.status` would have with the
+# summaries of `results` added.
+def status_archive_bytes(exp, results):
+    archive = dict(exp.status.get(ARCHIVE, {}))
+    archive.update((result.name, summarize_result(result))
+                   for result in results)
+    return len(json.dumps(archive, separators=(',', ':')))
+
+
+# Calls `delete(name)` for every name with at most `max_workers` requests in
+# flight. Returns the names whose deletion failed.
+def bulk_delete(delete, names, max_workers=8):
+    def attempt(name):
+        try:
+            delete(name)
+            return None
+        except Exception as e:
+            LOG.warning('unable to delete {}: {}'.format(name, e))
+            return name
+
+    if not names:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return [name for name in pool.map(attempt, names) if name is not None]
+
+
+# Archives and then deletes the results and jobs of `exp` that finished more
+# than `ttl_seconds` ago, along with results without a job that were created
+# more than `ttl_seconds` ago. Results that a kept result continues from are
+# kept, and so are their jobs, so that lineages stay whole until their last
+# result is collected. Returns the names of the collected jobs.
+def collect_garbage(client, exp, ttl_seconds, archive_path=None,
+                    max_workers=8):
+    # Results are listed first, so that a job created in between does not
+    # leave its result looking orphaned.
+    all_results = client.list_results(exp)
+    jobs = client.list_jobs(exp)
+
+    # A result has the same name as the job it represents.
+    job_names = set(job.metadata.name for job in jobs)
+    expired_names = set(job.metadata.name
+                        for job in expired_jobs(jobs, ttl_seconds))
+    # A result without a job here may belong to a job in another cluster, or
+    # to none at all, so it expires with its own age.
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+    collected = set(expired_names)
+    for result in all_results:
+        created = created_at(result)
+        if result.name not in job_names and created is not None and \
+           created <= cutoff:
+            collected.add(result.name)
+    while True:
+        parents = set(result.parent() for result in all_results
+                      if result.name not in collected)
+        if not collected & parents:
+            break
+        # Keeping a result may keep its own parent in turn.
+        collected -= parents
+
+    names = sorted(expired_names & collected)
+    results = [result for result in all_results if result.name in collected]
+    if not names and not results:
+        return []
+    LOG.info('archiving {} results of experiment {}'.format(
+        len(results), exp.name))
+
+    if archive_path is None:
+        # Re-read to avoid replacing the experiment with a stale version.
+        exp = client.get_experiment(exp.name)
+        if status_archive_bytes(exp, results) > MAX_STATUS_ARCHIVE_BYTES:
+            archive_path = '{}-archive.jsonl'.format(exp.name)
+            LOG.warning('archive of experiment {} is too large for its '
+                        'status; appending to {} instead'.format(
+                            exp.name, archive_path))
+    archive_results(exp, results, path=archive_path)
+    if archive_path is None:
+        client.update_experiment(exp)
+
+    failed = bulk_delete(client.delete_result,
+                         [result.name for result in results], max_workers)
+    failed += bulk_delete(client.delete_job, names, max_workers)
+    LOG.info('deleted {} jobs of experiment {} ({} deletions failed)'.format(
+        len(names), exp.name, len(failed)))
+    return names
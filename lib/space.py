@@ -0,0 +1,272 @@
+import ast
+import operator
+import sys
+
+
+# An experiment's parameters map each name to either a list of values, or to
+# a map of values and a condition under which the parameter applies:
+#
+# {
+#   "optimizer": ["sgd", "adam"],
+#   "momentum": {"values": [0.5, 0.9], "when": "optimizer == 'sgd'"},
+#   "batch_size": [32, 64, 128],
+#   "model_size": [1, 2, 4]
+# }
+#
+# A point leaves out parameters whose condition does not hold. Constraints are
+# expressions every point must satisfy, e.g. "batch_size * model_size <= 256".
+# A constraint or condition referring to a parameter that a point leaves out
+# holds, or does not hold, respectively.
+#
+# Expressions are python-like: literals, parameter names, arithmetic,
+# comparisons (including `in`), `and`, `or` and `not`.
+
+# Largest exponent `**` accepts, so that an expression like 10**10**10 fails
+# instead of computing for ever.
+MAX_EXPONENT = 64
+
+
+def power(base, exponent):
+    if isinstance(exponent, (int, float)) and abs(exponent) > MAX_EXPONENT:
+        raise Exception('Exponent {} is larger than {}'.format(
+            exponent, MAX_EXPONENT))
+    return operator.pow(base, exponent)
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: power
+}
+
+UNARY_OPERATORS = {
+    ast.Not: operator.not_,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos
+}
+
+COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b
+}
+
+# Spellings of JSON and YAML literals accepted alongside python's.
+LITERALS = {'true': True, 'false': False, 'null': None}
+
+
+# Raised while evaluating an expression that refers to a parameter the point
+# leaves out.
+class Inactive(Exception):
+    pass
+
+
+# A restricted expression over parameter values. Evaluation never calls into
+# arbitrary python, so expressions from experiment specs are safe to run.
+class Expression(object):
+    def __init__(self, source):
+        self.source = source
+        try:
+            tree = ast.parse(source, mode='eval')
+        except SyntaxError as e:
+            raise Exception('Invalid expression "{}": {}'.format(source, e))
+        self.names = set()
+        self._evaluate = self._compile(tree.body)
+
+    def __call__(self, point):
+        return self._evaluate(point)
+
+    def _compile(self, node):
+        if isinstance(node, ast.Constant) or (
+                sys.version_info < (3, 8) and
+                isinstance(node, (ast.Num, ast.Str, ast.NameConstant))):
+            value = ast.literal_eval(node)
+            return lambda point: value
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in LITERALS:
+                value = LITERALS[name]
+                return lambda point: value
+            self.names.add(name)
+
+            def lookup(point):
+                if name not in point:
+                    raise Inactive(name)
+                return point[name]
+            return lookup
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            items = [self._compile(item) for item in node.elts]
+            return lambda point: [item(point) for item in items]
+        if isinstance(node, ast.BoolOp):
+            operands = [self._compile(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return lambda point: all(o(point) for o in operands)
+            return lambda point: any(o(point) for o in operands)
+        if isinstance(node, ast.UnaryOp) and \
+           type(node.op) in UNARY_OPERATORS:
+            op = UNARY_OPERATORS[type(node.op)]
+            operand = self._compile(node.operand)
+            return lambda point: op(operand(point))
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            op = BINARY_OPERATORS[type(node.op)]
+            left = self._compile(node.left)
+            right = self._compile(node.right)
+            return lambda point: op(left(point), right(point))
+        if isinstance(node, ast.Compare) and \
+           all(type(op) in COMPARISONS for op in node.ops):
+            left = self._compile(node.left)
+            ops = [COMPARISONS[type(op)] for op in node.ops]
+            comparators = [self._compile(c) for c in node.comparators]
+
+            def compare(point):
+                a = left(point)
+                for op, comparator in zip(ops, comparators):
+                    b = comparator(point)
+                    if not op(a, b):
+                        return False
+                    a = b
+                return True
+            return compare
+        raise Exception('Unsupported syntax in expression "{}": {}'.format(
+            self.source, type(node).__name__))
+
+
+class Parameter(object):
+    def __init__(self, name, spec):
+        self.name = name
+        self.when = None
+        if isinstance(spec, dict):
+            if 'values' not in spec:
+                raise Exception('Parameter {} has no values'.format(name))
+            self.values = spec['values']
+            if spec.get('when'):
+                self.when = Expression(spec['when'])
+        else:
+            self.values = spec
+
+    def applies(self, point):
+        if self.when is None:
+            return True
+        try:
+            return bool(self.when(point))
+        except Inactive:
+            return False
+
+
+# The set of valid points of an experiment's parameters and constraints.
+#
+# Points are generated depth first, one parameter at a time. Conditions and
+# constraints are checked as soon as every parameter they refer to has been
+# decided, so invalid branches are pruned before the remaining parameters are
+# expanded rather than filtered out afterwards.
+class ParameterSpace(object):
+    def __init__(self, parameters, constraints=None):
+        self.parameters = self._order(
+            [Parameter(name, spec) for name, spec in parameters.items()])
+        self.constraints = [Expression(c) for c in constraints or []]
+
+        depths = dict((p.name, depth)
+                      for depth, p in enumerate(self.parameters))
+        # The constraints to check once the parameter at each depth is
+        # decided.
+        self._checks = [[] for _ in self.parameters]
+        for constraint in self.constraints:
+            unknown = constraint.names - set(depths)
+            if unknown:
+                raise Exception('Constraint "{}" refers to unknown '
+                                'parameters {}'.format(
+                                    constraint.source, sorted(unknown)))
+            if not self.parameters:
+                continue
+            depth = max([depths[name] for name in constraint.names] or [0])
+            self._checks[depth].append(constraint)
+
+    # Orders parameters so that each comes after the parameters its condition
+    # refers to, otherwise keeping the order they were given in.
+    @staticmethod
+    def _order(parameters):
+        names = set(p.name for p in parameters)
+        ordered = []
+        placed = set()
+        remaining = list(parameters)
+        while remaining:
+            for p in remaining:
+                dependencies = p.when.names if p.when else set()
+                unknown = dependencies - names
+                if unknown:
+                    raise Exception('Condition of parameter {} refers to '
+                                    'unknown parameters {}'.format(
+                                        p.name, sorted(unknown)))
+                if dependencies <= placed:
+                    break
+            else:
+                raise Exception('Parameter conditions are circular: {}'.format(
+                    ', '.join(p.name for p in remaining)))
+            remaining.remove(p)
+            ordered.append(p)
+            placed.add(p.name)
+        return ordered
+
+    def _valid(self, depth, point):
+        for constraint in self._checks[depth]:
+            try:
+                if not constraint(point):
+                    return False
+            except Inactive:
+                pass
+        return True
+
+    def _walk(self, depth, point):
+        if depth == len(self.parameters):
+            yield point
+            return
+        parameter = self.parameters[depth]
+        if not parameter.applies(point):
+            if self._valid(depth, point):
+                for leaf in self._walk(depth + 1, point):
+                    yield leaf
+            return
+        for value in parameter.values:
+            point[parameter.name] = value
+            if self._valid(depth, point):
+                for leaf in self._walk(depth + 1, point):
+                    yield leaf
+            del point[parameter.name]
+
+    # Returns True if `point`, which may hold values outside of the listed
+    # ones, has exactly the applicable parameters and satisfies every
+    # constraint.
+    def admits(self, point):
+        decided = {}
+        for parameter in self.parameters:
+            if parameter.applies(decided) != (parameter.name in point):
+                return False
+            if parameter.name in point:
+                decided[parameter.name] = point[parameter.name]
+        if len(decided) != len(point):
+            return False
+        for constraint in self.constraints:
+            try:
+                if not constraint(point):
+                    return False
+            except Inactive:
+                pass
+        return True
+
+    # Yields each valid point as a map of parameter names to values.
+    def points(self):
+        for point in self._walk(0, {}):
+            yield dict(point)
+
+    # Returns the exact number of valid points without building them.
+    def count(self):
+        return sum(1 for _ in self._walk(0, {}))
@@ -0,0 +1,644 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from lib import ratelimit
+from lib.exp import API, API_VERSION, RESULTS, Result, api_exception, kube
+import abc
+import json
+import logging
+import os
+import queue
+import socketserver
+import sqlite3
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+
+LOG = logging.getLogger(__name__)
+
+# Most write operations committed in one SQLite transaction.
+MAX_BATCH = 1000
+
+# Results whose metric rows are remembered by the writer, see
+# `SQLiteDatabase._write_metrics`.
+MAX_CACHED_RESULTS = 1024
+
+
+# Where `Client` keeps results.
+#
+# Every store is bound to a client, whose namespace it uses and whose retry
+# helper it calls through for remote requests.
+class ResultStore(abc.ABC):
+    def __init__(self, client):
+        self.client = client
+
+    @abc.abstractmethod
+    def list_results(self, experiment=None, compact=False):
+        pass
+
+    @abc.abstractmethod
+    def get_result(self, name):
+        pass
+
+    @abc.abstractmethod
+    def create_result(self, result):
+        pass
+
+    @abc.abstractmethod
+    def update_result(self, result):
+        pass
+
+    @abc.abstractmethod
+    def delete_result(self, name):
+        pass
+
+
+# Keeps results as `Result` custom resources next to their experiment.
+class CustomResourceStore(ResultStore):
+    def list_results(self, experiment=None, compact=False):
+        namespace = self.client.namespace
+        max_retries_error = ("Maximum retries reached when listing results "
+                             "in namespace {}.".format(namespace))
+        api_kwargs = {
+            "group": API,
+            "version": API_VERSION,
+            "namespace": namespace,
+            "plural": RESULTS
+        }
+        if experiment is not None:
+            api_kwargs["label_selector"] = 'experiment={}'.format(
+                experiment.name)
+        response = self.client._retry_poll_api(
+            self.client.k8s.list_namespaced_custom_object, max_retries_error,
+            api_kwargs=api_kwargs,
+            priority=ratelimit.LIST)
+        return [Result.from_body(item, compact=compact)
+                for item in response['items']]
+
+    def get_result(self, name):
+        namespace = self.client.namespace
+        max_retries_error = ("Maximum retries reached when checking for "
+                             "result {} in namespace {}.".format(
+                              name, namespace))
+        response = self.client._retry_poll_api(
+            self.client.k8s.get_namespaced_custom_object, max_retries_error,
+            api_kwargs={
+                "group": API,
+                "version": API_VERSION,
+                "namespace": namespace,
+                "plural": RESULTS,
+                "name": name
+            },
+            priority=ratelimit.GET)
+        return Result.from_body(response)
+
+    def create_result(self, result):
+        namespace = self.client.namespace
+        max_retries_error = ("Maximum retries reached when creating result "
+                             "in namespace {}.".format(namespace))
+        response = self.client._retry_poll_api(
+            self.client.k8s.create_namespaced_custom_object,
+            max_retries_error,
+            api_kwargs={
+                "group": API,
+                "version": API_VERSION,
+                "namespace": namespace,
+                "plural": RESULTS,
+                "body": result.to_body()
+            },
+            priority=ratelimit.WRITE_RESULT)
+        return Result.from_body(response)
+
+    def update_result(self, result):
+        namespace = self.client.namespace
+        max_retries_error = ("Maximum retries reached when updating result {} "
+                             "in namespace {}.".format(
+                              result.name, namespace))
+        response = self.client._retry_poll_api(
+            self.client.k8s.replace_namespaced_custom_object,
+            max_retries_error,
+            api_kwargs={
+                "group": API,
+                "version": API_VERSION,
+                "namespace": namespace,
+                "plural": RESULTS,
+                "name": result.name,
+                "body": result.to_body()
+            },
+            priority=ratelimit.WRITE_RESULT)
+
+        return Result.from_body(response)
+
+    def delete_result(self, name):
+        namespace = self.client.namespace
+        max_retries_error = ("Maximum retries reached when deleting result {} "
+                             "in namespace {}.".format(
+                              name, namespace))
+        return self.client._retry_poll_api(
+            self.client.k8s.delete_namespaced_custom_object,
+            max_retries_error,
+            api_kwargs={
+                "group": API,
+                "version": API_VERSION,
+                "namespace": namespace,
+                "plural": RESULTS,
+                "name": name,
+                "body": kube().models.V1DeleteOptions()
+            },
+            priority=ratelimit.WRITE)
+
+
+# Flattens result values into (step, metric, value) rows. Values are either
+# numbers, recorded with an empty step, or maps of metric names to numbers
+# keyed by step, like {"step-10": {"loss": 0.3}}.
+def metric_rows(values):
+    def numeric(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    rows = []
+    for key, value in values.items():
+        if numeric(value):
+            rows.append(('', key, float(value)))
+        elif isinstance(value, dict):
+            rows.extend((key, metric, float(v))
+                        for metric, v in value.items() if numeric(v))
+    return rows
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    experiment TEXT NOT NULL,
+    resource_version INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (namespace, name)
+);
+CREATE INDEX IF NOT EXISTS results_by_experiment
+    ON results (namespace, experiment);
+CREATE TABLE IF NOT EXISTS metrics (
+    namespace TEXT NOT NULL,
+    result TEXT NOT NULL,
+    experiment TEXT NOT NULL,
+    step TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (namespace, result, step, metric)
+);
+CREATE INDEX IF NOT EXISTS metrics_by_metric
+    ON metrics (namespace, metric, experiment, value);
+CREATE INDEX IF NOT EXISTS metrics_by_experiment
+    ON metrics (namespace, experiment, metric, value);
+'''
+
+
+# An embedded SQLite database of results, shared by every client of the
+# process that uses the same file.
+#
+# Besides the result bodies, the numeric values of every result are kept as
+# indexed metric rows, so that analytical queries such as `best_values` need
+# not decode any result. The database runs in WAL mode so that reads proceed
+# while writing. All writes go through one writer thread, which commits the
+# operations queued by concurrent callers in a single transaction.
+class SQLiteDatabase(object):
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        # Metric rows last written per result, to write only changed rows.
+        # Only the writer thread uses it. The least recently written results
+        # are forgotten beyond MAX_CACHED_RESULTS and read back on their next
+        # update.
+        self._written = OrderedDict()
+        # Results whose metric rows the current operation wrote.
+        self._touched = set()
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(SCHEMA)
+        writer = threading.Thread(target=self._write_loop,
+                                  name='result-store-writer')
+        writer.daemon = True
+        writer.start()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Jobs of the local backend may share the file with other
+            # processes, so wait for their transactions rather than failing.
+            connection = sqlite3.connect(self.path, timeout=30,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _forget(self, keys):
+        for key in keys:
+            self._written.pop(key, None)
+
+    # Runs a batch of operations in one transaction and returns the future,
+    # value and error of each.
+    def _write_batch(self, connection, batch):
+        outcomes = []
+        # Results whose metric rows were written by the batch, which the
+        # cache must forget if the batch is rolled back.
+        written = set()
+        connection.execute('BEGIN')
+        for operation, future in batch:
+            # A failed operation must not undo the rest of the batch.
+            self._touched = set()
+            connection.execute('SAVEPOINT operation')
+            try:
+                outcomes.append((future, operation(connection), None))
+                connection.execute('RELEASE operation')
+                written |= self._touched
+            except Exception as e:
+                connection.execute('ROLLBACK TO operation')
+                connection.execute('RELEASE operation')
+                self._forget(self._touched)
+                outcomes.append((future, None, e))
+        try:
+            connection.execute('COMMIT')
+        except Exception:
+            self._forget(written)
+            raise
+        return outcomes
+
+    def _write_loop(self):
+        connection = self._connection()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                outcomes = self._write_batch(connection, batch)
+            except Exception as e:
+                # The writer must survive, or every later write would wait
+                # for ever.
+                LOG.error('unable to commit results: {}'.format(e))
+                if connection.in_transaction:
+                    try:
+                        connection.execute('ROLLBACK')
+                    except Exception as rollback_error:
+                        LOG.error('unable to roll back results: {}'.format(
+                            rollback_error))
+                outcomes = [(future, None, e) for _, future in batch]
+            for future, value, error in outcomes:
+                if error is None:
+                    future.set_result(value)
+                else:
+                    future.set_exception(error)
+
+    # Runs `operation(connection)` in the writer thread and returns its
+    # outcome once committed.
+    def write(self, operation):
+        future = Future()
+        self._queue.put((operation, future))
+        return future.result()
+
+    def read(self, sql, parameters=()):
+        return self._connection().execute(sql, parameters).fetchall()
+
+    def _write_metrics(self, connection, namespace, name, experiment,
+                       values):
+        key = (namespace, name)
+        written = self._written.get(key, {})
+        rows = dict(((step, metric), value)
+                    for step, metric, value in metric_rows(values))
+        changed = [(namespace, name, experiment, step, metric, value)
+                   for (step, metric), value in rows.items()
+                   if written.get((step, metric)) != value]
+        if changed:
+            connection.executemany(
+                'INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?, ?)',
+                changed)
+        removed = [(namespace, name, step, metric)
+                   for step, metric in set(written) - set(rows)]
+        if removed:
+            connection.executemany(
+                'DELETE FROM metrics WHERE namespace = ? AND result = ? '
+                'AND step = ? AND metric = ?', removed)
+        self._written[key] = rows
+        self._written.move_to_end(key)
+        self._touched.add(key)
+        while len(self._written) > MAX_CACHED_RESULTS:
+            self._written.popitem(last=False)
+
+    def create(self, namespace, body):
+        metadata = body['metadata']
+        name = metadata['name']
+        experiment = metadata.get('labels', {}).get('experiment', '')
+        metadata['namespace'] = namespace
+        metadata.setdefault('uid', str(uuid.uuid4()))
+        metadata['creationTimestamp'] = datetime.now(timezone.utc).strftime(
+            '%Y-%m-%dT%H:%M:%SZ')
+        metadata['resourceVersion'] = '1'
+
+        def operation(connection):
+            try:
+                connection.execute(
+                    'INSERT INTO results VALUES (?, ?, ?, 1, ?)',
+                    (namespace, name, experiment, json.dumps(body)))
+            except sqlite3.IntegrityError:
+                raise api_exception(
+                    409, 'AlreadyExists',
+                    'results "{}" already exists'.format(name))
+            self._written.pop((namespace, name), None)
+            self._write_metrics(connection, namespace, name, experiment,
+                                body.get('status', {}).get('values', {}))
+            return body
+        return self.write(operation)
+
+    def replace(self, namespace, name, body):
+        experiment = body['metadata'].get('labels', {}).get('experiment', '')
+
+        def operation(connection):
+            row = connection.execute(
+                'SELECT resource_version FROM results '
+                'WHERE namespace = ? AND name = ?',
+                (namespace, name)).fetchone()
+            if row is None:
+                raise api_exception(
+                    404, 'NotFound', 'results "{}" not found'.format(name))
+            version = row[0] + 1
+            body['metadata']['resourceVersion'] = str(version)
+            connection.execute(
+                'UPDATE results SET resource_version = ?, experiment = ?, '
+                'body = ? WHERE namespace = ? AND name = ?',
+                (version, experiment, json.dumps(body), namespace, name))
+            if (namespace, name) not in self._written:
+                self._written[(namespace, name)] = dict(
+                    ((step, metric), value) for step, metric, value in
+                    connection.execute(
+                        'SELECT step, metric, value FROM metrics '
+                        'WHERE namespace = ? AND result = ?',
+                        (namespace, name)))
+            self._write_metrics(connection, namespace, name, experiment,
+                                body.get('status', {}).get('values', {}))
+            return body
+        return self.write(operation)
+
+    def delete(self, namespace, name):
+        def operation(connection):
+            deleted = connection.execute(
+                'DELETE FROM results WHERE namespace = ? AND name = ?',
+                (namespace, name)).rowcount
+            if not deleted:
+                raise api_exception(
+                    404, 'NotFound', 'results "{}" not found'.format(name))
+            connection.execute(
+                'DELETE FROM metrics WHERE namespace = ? AND result = ?',
+                (namespace, name))
+            self._written.pop((namespace, name), None)
+            return {'kind': 'Status', 'status': 'Success'}
+        return self.write(operation)
+
+    def get(self, namespace, name):
+        rows = self.read('SELECT body FROM results '
+                         'WHERE namespace = ? AND name = ?',
+                         (namespace, name))
+        if not rows:
+            raise api_exception(
+                404, 'NotFound', 'results "{}" not found'.format(name))
+        return json.loads(rows[0][0])
+
+    def list(self, namespace, experiment=None):
+        if experiment is None:
+            rows = self.read('SELECT body FROM results WHERE namespace = ? '
+                             'ORDER BY name', (namespace,))
+        else:
+            rows = self.read('SELECT body FROM results WHERE namespace = ? '
+                             'AND experiment = ? ORDER BY name',
+                             (namespace, experiment))
+        return [json.loads(row[0]) for row in rows]
+
+    # Returns the best value of `metric` recorded by any result, per
+    # experiment.
+    def best_values(self, namespace, metric, mode='max'):
+        if mode not in ('max', 'min'):
+            raise Exception('mode must be either max or min')
+        return dict(self.read(
+            'SELECT experiment, {}(value) FROM metrics '
+            'WHERE namespace = ? AND metric = ? '
+            'GROUP BY experiment'.format(mode.upper()),
+            (namespace, metric)))
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def database(path):
+    path = os.path.abspath(path)
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = SQLiteDatabase(path)
+        return _databases[path]
+
+
+# Keeps results in a local SQLite database file.
+class SQLiteResultStore(ResultStore):
+    def __init__(self, client, path):
+        super(SQLiteResultStore, self).__init__(client)
+        self.database = database(path)
+
+    def list_results(self, experiment=None, compact=False):
+        return [Result.from_body(body, compact=compact)
+                for body in self.database.list(
+                    self.client.namespace,
+                    experiment.name if experiment is not None else None)]
+
+    def get_result(self, name):
+        return Result.from_body(
+            self.database.get(self.client.namespace, name))
+
+    def create_result(self, result):
+        return Result.from_body(self.database.create(
+            self.client.namespace, result.to_body()))
+
+    def update_result(self, result):
+        return Result.from_body(self.database.replace(
+            self.client.namespace, result.name, result.to_body()))
+
+    def delete_result(self, name):
+        return self.database.delete(self.client.namespace, name)
+
+    def best_values(self, metric, mode='max'):
+        return self.database.best_values(self.client.namespace, metric, mode)
+
+
+# Keeps results in a SQLite database behind a result store service (see
+# `serve`), so that jobs in a cluster can share one database.
+class HTTPResultStore(ResultStore):
+    def __init__(self, client, url):
+        super(HTTPResultStore, self).__init__(client)
+        self.url = url.rstrip('/')
+
+    def _request(self, method, path, body=None, query=None):
+        url = '{}/namespaces/{}/{}'.format(
+            self.url, urllib.parse.quote(self.client.namespace), path)
+        if query:
+            url += '?' + urllib.parse.urlencode(query)
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+
+        def send():
+            request = urllib.request.Request(
+                url, data=data, method=method,
+                headers={'Content-Type': 'application/json'})
+            try:
+                with urllib.request.urlopen(request) as response:
+                    return json.loads(response.read().decode('utf-8'))
+            except urllib.error.HTTPError as e:
+                status = json.loads(e.read().decode('utf-8'))
+                error = api_exception(e.code, status.get('reason'),
+                                      status.get('message'))
+                if e.code >= 500:
+                    raise error
+                # Client errors are final, so they bypass the retries.
+                return error
+            except urllib.error.URLError as e:
+                # Retried like an unavailable API server.
+                raise api_exception(503, 'ServiceUnavailable', str(e.reason))
+
+        max_retries_error = ("Maximum retries reached when requesting {} {} "
+                             "from result store {}.".format(
+                              method, path, self.url))
+        response = self.client._retry_poll_api(send, max_retries_error)
+        if isinstance(response, kube().rest.ApiException):
+            raise response
+        return response
+
+    def list_results(self, experiment=None, compact=False):
+        query = None
+        if experiment is not None:
+            query = {'experiment': experiment.name}
+        response = self._request('GET', RESULTS, query=query)
+        return [Result.from_body(item, compact=compact)
+                for item in response['items']]
+
+    def get_result(self, name):
+        return Result.from_body(self._request(
+            'GET', '{}/{}'.format(RESULTS, urllib.parse.quote(name))))
+
+    def create_result(self, result):
+        return Result.from_body(self._request(
+            'POST', RESULTS, result.to_body()))
+
+    def update_result(self, result):
+        return Result.from_body(self._request(
+            'PUT', '{}/{}'.format(RESULTS, urllib.parse.quote(result.name)),
+            result.to_body()))
+
+    def delete_result(self, name):
+        return self._request(
+            'DELETE', '{}/{}'.format(RESULTS, urllib.parse.quote(name)))
+
+    def best_values(self, metric, mode='max'):
+        return self._request('GET', 'best', query={'metric': metric,
+                                                   'mode': mode})
+
+
+# Serves a SQLite database of results over HTTP for `HTTPResultStore`.
+class ResultStoreHandler(BaseHTTPRequestHandler):
+    # Set by `serve`.
+    database = None
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def _handle(self, method):
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = [urllib.parse.unquote(part)
+                 for part in url.path.strip('/').split('/')]
+        try:
+            if len(parts) < 3 or parts[0] != 'namespaces':
+                raise api_exception(404, 'NotFound', 'Unknown path')
+            namespace, resource, names = parts[1], parts[2], parts[3:]
+            if resource == 'best' and method == 'GET' and not names:
+                self._reply(200, self.database.best_values(
+                    namespace, query['metric'], query.get('mode', 'max')))
+            elif resource != RESULTS or len(names) > 1:
+                raise api_exception(404, 'NotFound', 'Unknown path')
+            elif method == 'GET' and not names:
+                self._reply(200, {'items': self.database.list(
+                    namespace, query.get('experiment'))})
+            elif method == 'POST' and not names:
+                self._reply(201, self.database.create(
+                    namespace, self._body()))
+            elif method == 'GET' and names:
+                self._reply(200, self.database.get(namespace, names[0]))
+            elif method == 'PUT' and names:
+                self._reply(200, self.database.replace(
+                    namespace, names[0], self._body()))
+            elif method == 'DELETE' and names:
+                self._reply(200, self.database.delete(namespace, names[0]))
+            else:
+                raise api_exception(405, 'MethodNotAllowed',
+                                    'Unsupported method')
+        except kube().rest.ApiException as e:
+            self._reply(e.status, json.loads(e.body))
+        except Exception as e:
+            LOG.exception('unable to handle {} {}'.format(method, self.path))
+            self._reply(500, {'reason': 'InternalError', 'message': str(e)})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def log_message(self, format, *args):
+        LOG.debug(format % args)
+
+
+class ResultStoreServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+# Serves the SQLite database at `path` until interrupted.
+def serve(path, host='0.0.0.0', port=8080):
+    handler = type('Handler', (ResultStoreHandler,),
+                   {'database': database(path)})
+    server = ResultStoreServer((host, port), handler)
+    LOG.info('serving results from {} on {}:{}'.format(path, host, port))
+    server.serve_forever()
+
+
+# Returns the store that `url` points at for `client`:
+#
+#   crd (or nothing)      Result custom resources.
+#   sqlite:///<path>      A local SQLite database file.
+#   http://<host>:<port>  A result store service.
+def from_url(url, client):
+    if not url or url == 'crd':
+        return CustomResourceStore(client)
+    if url.startswith('sqlite://'):
+        return SQLiteResultStore(client, url[len('sqlite://'):])
+    if url.startswith('http://') or url.startswith('https://'):
+        return HTTPResultStore(client, url)
+    raise Exception('Unknown result store {}'.format(url))
@@ -4,20 +4,53 @@
 """optimizer.
 
 Usage:
-  optimizer.py --namespace=<ns> --experiment-name=<exp> [--verbose]
+  optimizer.py --namespace=<ns> --experiment-name=<exp> [options]
+  optimizer.py --namespace=<ns> --experiment-file=<file> [options]
 
 Options:
-  -h --help           Show this screen.
-  --version           Show version.
-  --namespace=<ns>    Experiment namespace [default: default].
-  --experiment=<exp>  Experiment name.
-  --verbose           Enable verbose log output.
+  -h --help                 Show this screen.
+  --version                 Show version.
+  --namespace=<ns>          Experiment namespace [default: default].
+  --experiment-name=<exp>   Experiment name.
+  --experiment-file=<file>  Experiment manifest, created if not present yet.
+  --targets=<file>          YAML list of {context, namespace, capacity} maps
+                            to spread the jobs over, instead of <ns>.
+  --strategy=<s>            Search strategy, grid, pbt or pareto
+                            [default: grid].
+  --metric=<m>              Per-step metric that pbt ranks jobs by.
+  --mode=<mode>             Whether pbt maximizes (max) or minimizes (min)
+                            the metric [default: max].
+  --population=<n>          Number of jobs pbt keeps running [default: 8].
+  --ready-steps=<n>         Steps a pbt job records between decisions
+                            [default: 5].
+  --max-launches=<n>        Jobs pbt launches per population slot
+                            [default: 10].
+  --objectives=<o>          Metrics pareto trades off, like
+                            accuracy:max,latency:min.
+  --max-jobs=<n>            Jobs pareto creates, for the points nearest to
+                            the current Pareto front [default: 10].
+  --watch                   Watch the grid or pareto jobs until they finish,
+                            retry those that failed for transient reasons
+                            and report the failures.
+  --max-attempts=<n>        Attempts per point when watching [default: 3].
+  --watch-interval=<s>      Seconds between checks of the watched jobs
+                            [default: 30].
+  --dry-run                 Report the number of valid points without
+                            creating jobs.
+  --verbose                 Enable verbose log output.
+
+Set EXPERIMENT_BACKEND=local to run the jobs as local processes instead of
+Kubernetes jobs.
 """
 from docopt import docopt
-import itertools
 import json
-from lib.exp import Client
+from lib.exp import Client, Experiment, LOCAL
+from lib.failures import FailureWatcher
+from lib.fanout import FanoutClient, load_targets
+from lib.pbt import PopulationBasedTraining
+from lib.space import ParameterSpace
 import logging
+import yaml
 
 
 VERBOSE = False
@@ -37,21 +70,113 @@ def main():
     LOG.debug('arguments:\n{}'.format(args))
 
     namespace = args['--namespace']
-    experiment_name = args['--experiment-name']
     client = Client(namespace)
-    do_grid_search(client, client.get_experiment(experiment_name))
+    if args['--experiment-file']:
+        # A dry run must not create the experiment.
+        exp = load_experiment(client, args['--experiment-file'],
+                              create=not args['--dry-run'])
+    else:
+        exp = client.get_experiment(args['--experiment-name'])
+
+    if args['--dry-run']:
+        LOG.info('experiment {} has {} valid points'.format(
+            exp.name, ParameterSpace(exp.parameters, exp.constraints).count()))
+        return
+
+    search_client = client
+    if args['--targets']:
+        search_client = FanoutClient(load_targets(args['--targets']))
+
+    jobs = None
+    if args['--strategy'] == 'pbt':
+        if not args['--metric']:
+            raise Exception('The pbt strategy requires --metric')
+        PopulationBasedTraining(
+            search_client, exp, args['--metric'], mode=args['--mode'],
+            population=int(args['--population']),
+            ready_steps=int(args['--ready-steps']),
+            max_launches=int(args['--max-launches'])).run()
+    elif args['--strategy'] == 'pareto':
+        if not args['--objectives']:
+            raise Exception('The pareto strategy requires --objectives')
+        jobs = do_pareto_search(search_client, exp, args['--objectives'],
+                                int(args['--max-jobs']))
+    elif args['--strategy'] == 'grid':
+        jobs = do_grid_search(search_client, exp)
+    else:
+        raise Exception('Unknown strategy {}'.format(args['--strategy']))
+
+    if args['--watch'] and jobs is not None:
+        report = FailureWatcher(
+            search_client, exp, max_attempts=int(args['--max-attempts']),
+            interval=float(args['--watch-interval'])).watch(jobs).run()
+        LOG.info('job report:\n{}'.format(json.dumps(
+            report, sort_keys=True, indent=2)))
+
+    if client.backend == LOCAL:
+        # Local jobs are children of this process.
+        client.batch.wait()
+    elif client.limiter is not None:
+        LOG.debug('API requests by priority:\n{}'.format(json.dumps(
+            client.limiter.stats(), sort_keys=True, indent=2)))
+
+
+# Returns the experiment described by the manifest at `path`, creating it
+# first if the namespace does not contain it yet. Without `create`, the
+# manifest's experiment is returned as is instead.
+def load_experiment(client, path, create=True):
+    with open(path) as manifest:
+        exp = Experiment.from_body(yaml.safe_load(manifest))
+    for existing in client.list_experiments():
+        if existing.name == exp.name:
+            return existing
+    if not create:
+        return exp
+    return client.create_experiment(exp)
 
 
 def do_grid_search(client, exp):
-    build_grid_jobs(client, exp)
+    return build_grid_jobs(client, exp)
 
 
+# Creates a job for every valid point of the experiment. Returns the jobs.
 def build_grid_jobs(client, exp):
-    for point in grid(exp.parameters):
+    space = ParameterSpace(exp.parameters, exp.constraints)
+    LOG.info('creating jobs for {} valid points'.format(space.count()))
+    jobs = []
+    for point in space.points():
         LOG.info('creating job for point:\n{}'.format(json.dumps(
             point, sort_keys=True, indent=2)))
         job = client.create_job(exp, point)
         LOG.info('created job: {}'.format(job.metadata.name))
+        jobs.append(job)
+    return jobs
+
+
+# Creates up to `max_jobs` jobs for the points not run yet that are nearest to
+# the Pareto front of the experiment's results over `objectives`. Returns the
+# jobs.
+def do_pareto_search(client, exp, objectives, max_jobs):
+    # NumPy is only required for this strategy.
+    from lib.pareto import ParetoFront, parse_objectives, prioritize
+
+    space = ParameterSpace(exp.parameters, exp.constraints)
+    results = client.list_results(exp, compact=True)
+    front = ParetoFront(parse_objectives(objectives)).update(results).front()
+    LOG.info('{} of {} results are on the Pareto front'.format(
+        len(front), len(results)))
+    done = set(json.dumps(result.job_parameters(), sort_keys=True)
+               for result in results)
+    points = [point for point in space.points()
+              if json.dumps(point, sort_keys=True) not in done]
+    jobs = []
+    for point in prioritize(points, front, space)[:max_jobs]:
+        LOG.info('creating job for point:\n{}'.format(json.dumps(
+            point, sort_keys=True, indent=2)))
+        job = client.create_job(exp, point)
+        LOG.info('created job: {}'.format(job.metadata.name))
+        jobs.append(job)
+    return jobs
 
 
 # `parameters` is a map that looks like this:
@@ -62,25 +187,13 @@ def build_grid_jobs(client, exp):
 #   "z": ["foo", "bar"]
 # }
 #
+# Parameters may also be conditional, and `constraints` may exclude points,
+# see `lib.space`.
+#
 # This function returns a list of maps of parameter names to parameter
 # values.
-def grid(parameters):
-    # Returns a list of (name, value) 2-tuples representing this parameter.
-    def expand(name, values):
-        return [(name, value) for value in values]
-
-    expanded_parameters = [expand(item[0], item[1]) for item in
-                           parameters.items()]
-
-    results = []
-    for point in itertools.product(*expanded_parameters):
-        LOG.debug('processing point: {}'.format(point))
-        result = {}
-        for named_value in point:
-            (name, value) = named_value
-            result[name] = value
-        results.append(result)
-    return results
+def grid(parameters, constraints=None):
+    return list(ParameterSpace(parameters, constraints).points())
 
 
 if __name__ == '__main__':
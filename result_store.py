@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+
+"""result store.
+
+Serves results kept in a SQLite database to jobs and optimizers configured
+with RESULT_STORE=http://<host>:<port>.
+
+Usage:
+  result_store.py --path=<db> [--host=<host>] [--port=<port>] [--verbose]
+
+Options:
+  -h --help        Show this screen.
+  --version        Show version.
+  --path=<db>      SQLite database file, created if missing.
+  --host=<host>    Address to listen on [default: 0.0.0.0].
+  --port=<port>    Port to listen on [default: 8080].
+  --verbose        Enable verbose log output.
+"""
+from docopt import docopt
+from lib.store import serve
+import logging
+
+
+LOG = None
+
+
+def main():
+    global LOG
+    # Parse arguments
+    args = docopt(__doc__, version='result store 0.1.0')
+
+    # Set up logging
+    LOG = logging.getLogger('result_store')
+    logging.basicConfig(level=logging.INFO)
+    if args['--verbose']:
+        logging.basicConfig(level=logging.DEBUG)
+    LOG.debug('arguments:\n{}'.format(args))
+
+    serve(args['--path'], args['--host'], int(args['--port']))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+from lib import load_config
 from lib.exp import Client
 import json
 import os
@@ -10,6 +11,7 @@ ns = os.getenv("EXPERIMENT_NAMESPACE", "demo")
 test_namespace = k8sclient.V1Namespace()
 test_namespace.metadata = k8sclient.V1ObjectMeta(name=ns)
 
+load_config()
 v1_api = k8sclient.CoreV1Api()
 try:
     v1_api.create_namespace(test_namespace)
@@ -1,3 +1,4 @@
+from lib import load_config
 from lib.exp import Client
 import uuid
 from kubernetes import client as k8sclient
@@ -8,6 +9,7 @@ test_namespace.metadata = k8sclient.V1ObjectMeta(name='ns'+str(uuid.uuid4()))
 
 
 def setup():
+    load_config()
     v1_api = k8sclient.CoreV1Api()
     v1_api.create_namespace(test_namespace)
 
@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta, timezone
+from kubernetes import client as k8sclient
+from lib import failures
+from lib.exp import Experiment
+from lib.failures import FailureWatcher, classify_job, classify_pod
+import json
+
+
+NOW = datetime(2018, 6, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def job(name, parameters=None, succeeded=None, failed_reason=None):
+    conditions = []
+    if failed_reason is not None:
+        conditions.append(k8sclient.V1JobCondition(
+            type='Failed', status='True', reason=failed_reason,
+            last_transition_time=NOW))
+    return k8sclient.V1Job(
+        metadata=k8sclient.V1ObjectMeta(name=name, annotations={
+            'job_parameters': json.dumps(parameters or {})}),
+        status=k8sclient.V1JobStatus(
+            start_time=NOW - timedelta(minutes=10), succeeded=succeeded,
+            conditions=conditions))
+
+
+def pod(job_name, reason=None, conditions=None, terminated=None,
+        waiting=None, phase='Failed', created=NOW):
+    state = k8sclient.V1ContainerState(terminated=terminated,
+                                       waiting=waiting)
+    return k8sclient.V1Pod(
+        metadata=k8sclient.V1ObjectMeta(
+            name=job_name + '-pod', labels={'job-name': job_name},
+            creation_timestamp=created),
+        status=k8sclient.V1PodStatus(
+            phase=phase, reason=reason, conditions=conditions,
+            container_statuses=[k8sclient.V1ContainerStatus(
+                name='main', image='main', image_id='', ready=False,
+                restart_count=0, state=state)]))
+
+
+def terminated(reason, exit_code):
+    return k8sclient.V1ContainerStateTerminated(reason=reason,
+                                                exit_code=exit_code)
+
+
+def test_classify_pod():
+    assert classify_pod(pod('a', reason='Evicted')) == failures.EVICTED
+    assert classify_pod(pod('a', conditions=[k8sclient.V1PodCondition(
+        type='DisruptionTarget', status='True',
+        reason='PreemptionByScheduler')])) == failures.PREEMPTED
+    assert classify_pod(pod('a', terminated=terminated('OOMKilled', 137))) \
+        == failures.OOM_KILLED
+    assert classify_pod(pod('a', terminated=terminated('Error', 1))) == \
+        failures.APPLICATION
+    assert classify_pod(pod(
+        'a', phase='Pending',
+        waiting=k8sclient.V1ContainerStateWaiting(
+            reason='ImagePullBackOff'))) == failures.IMAGE_PULL
+    # The kubelet retries the pull until it backs off.
+    assert classify_pod(pod(
+        'a', phase='Pending',
+        waiting=k8sclient.V1ContainerStateWaiting(
+            reason='ErrImagePull'))) is None
+    assert classify_pod(pod('a', phase='Running')) is None
+
+
+def test_classify_job():
+    assert classify_job(job('a'), []) is None
+    assert classify_job(job('a', failed_reason='DeadlineExceeded'),
+                        [pod('a', terminated=terminated('Error', 1))]) == \
+        failures.DEADLINE_EXCEEDED
+    assert classify_job(job('a', failed_reason='BackoffLimitExceeded'),
+                        [pod('a', reason='Evicted')]) == failures.EVICTED
+    # Without pods, as on the local backend.
+    assert classify_job(job('a', failed_reason='BackoffLimitExceeded'),
+                        []) == failures.APPLICATION
+
+    # Pulls in back-off fail the job only after the grace period.
+    stuck = [pod('a', phase='Pending', created=NOW - timedelta(minutes=1),
+                 waiting=k8sclient.V1ContainerStateWaiting(
+                     reason='ImagePullBackOff'))]
+    assert classify_job(job('a'), stuck, now=NOW) is None
+    assert classify_job(job('a'), stuck, now=NOW + timedelta(minutes=5)) \
+        == failures.IMAGE_PULL
+
+
+class FakeClient(object):
+    def __init__(self, jobs, pods):
+        self.jobs = dict((j.metadata.name, j) for j in jobs)
+        self.pods = pods
+        self.created = []
+
+    def list_jobs(self, experiment):
+        return list(self.jobs.values())
+
+    def list_pods(self, experiment):
+        return self.pods
+
+    def delete_job(self, name):
+        del self.jobs[name]
+
+    def create_job(self, experiment, parameters):
+        name = 'retry-{}'.format(len(self.created))
+        self.created.append(parameters)
+        self.jobs[name] = job(name, parameters)
+        return self.jobs[name]
+
+
+def test_watcher_retries_transient_failures():
+    jobs = [job('evicted', {'x': 1}, failed_reason='BackoffLimitExceeded'),
+            job('oom', {'x': 2}, failed_reason='BackoffLimitExceeded'),
+            job('done', {'x': 3}, succeeded=1)]
+    client = FakeClient(jobs, [
+        pod('evicted', reason='Evicted'),
+        pod('oom', terminated=terminated('OOMKilled', 137))])
+    watcher = FailureWatcher(client, Experiment('test', {}),
+                             max_attempts=2).watch(jobs)
+
+    assert watcher.step()
+    assert client.created == [{'x': 1}]
+    # Failed jobs are left for garbage collection.
+    assert 'evicted' in client.jobs and 'oom' in client.jobs
+
+    # The retry is evicted too, which exhausts its attempts.
+    client.jobs['retry-0'] = job('retry-0', {'x': 1},
+                                 failed_reason='BackoffLimitExceeded')
+    client.pods = [pod('retry-0', reason='Evicted')]
+    assert not watcher.step()
+    assert client.created == [{'x': 1}]
+
+    report = watcher.report()
+    assert report['succeeded'] == 1
+    assert report['failures'] == {
+        failures.EVICTED: {'jobs': 2, 'retried': 1, 'wasted_seconds': 1200.0},
+        failures.OOM_KILLED: {'jobs': 1, 'retried': 0,
+                              'wasted_seconds': 600.0}
+    }
+
+
+def test_watcher_deletes_jobs_stuck_pulling_their_image():
+    jobs = [job('stuck', {'x': 1})]
+    client = FakeClient(jobs, [pod(
+        'stuck', phase='Pending',
+        created=datetime.now(timezone.utc) - timedelta(hours=1),
+        waiting=k8sclient.V1ContainerStateWaiting(
+            reason='ImagePullBackOff'))])
+    watcher = FailureWatcher(client, Experiment('test', {})).watch(jobs)
+    assert not watcher.step()
+    assert client.jobs == {} and client.created == []
+    assert watcher.report()['failures'][failures.IMAGE_PULL]['jobs'] == 1
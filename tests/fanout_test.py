@@ -0,0 +1,47 @@
+from kubernetes import client as k8sclient
+from lib.exp import Experiment
+from lib.fanout import FanoutClient, Target
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.jobs = []
+
+    def list_experiments(self):
+        return [Experiment('test', {}, meta={'uid': 'abc'})]
+
+    def list_jobs(self, experiment):
+        return []
+
+    def list_pods(self, experiment):
+        return []
+
+    def create_job(self, experiment, parameters, parent=None):
+        name = 'test-{}'.format(len(self.jobs))
+        self.jobs.append(parameters)
+        return k8sclient.V1Job(metadata=k8sclient.V1ObjectMeta(name=name))
+
+
+def test_fanout_weighs_targets_by_capacity():
+    big = Target('big', capacity=3, client=FakeClient())
+    small = Target('small', capacity=1, client=FakeClient())
+    fanout = FanoutClient([big, small], refresh_interval=3600)
+    exp = Experiment('test', {})
+
+    for i in range(8):
+        fanout.create_job(exp, {'x': i})
+
+    assert len(big.client.jobs) == 6
+    assert len(small.client.jobs) == 2
+
+
+def test_fanout_avoids_slow_targets():
+    fast = Target('fast', capacity=2, client=FakeClient())
+    slow = Target('slow', capacity=2, client=FakeClient())
+    slow.latency = 120.0
+    fanout = FanoutClient([fast, slow], refresh_interval=3600)
+
+    for i in range(8):
+        fanout.create_job(Experiment('test', {}), {'x': i})
+
+    assert len(fast.client.jobs) > len(slow.client.jobs)
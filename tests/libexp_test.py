@@ -1,7 +1,7 @@
 import logging
 import json
 from . import test_namespace
-from lib.exp import Client, Experiment
+from lib.exp import Client, Experiment, Result, latest_step, stitch_values
 
 
 def log(msg):
@@ -45,7 +45,7 @@ def test_ux_flow():
     assert exp.name == 'test'
 
     verify_exp = c.get_experiment('test')
-    assert verify_exp.__dict__ == exp.__dict__
+    assert verify_exp.to_body() == exp.to_body()
 
     # Create a job for the test experiment
     #
@@ -77,10 +77,54 @@ def test_ux_flow():
     result = c.create_result(exp.result(job2))
 
     verify_result = c.get_result(result.name)
-    assert verify_result.__dict__ == result.__dict__
+    assert verify_result.to_body() == result.to_body()
 
     result.record_values({'fitness': 0.86})
     result = c.update_result(result)
 
     assert result.values()['fitness'] == 0.86
     assert result.job_parameters() == params
+
+
+def test_result_from_body_compact():
+    body = Result('test-1', 'test', 'abc').to_body()
+    body['metadata']['managedFields'] = [{'manager': 'kubectl'}]
+    body['status'] = {'values': {'step-10': {'loss': 0.5}}}
+
+    result = Result.from_body(body, compact=True)
+    assert not hasattr(result, '__dict__')
+    assert result.values() == {'step-10': {'loss': 0.5}}
+    assert 'managedFields' not in result.meta
+    assert result.meta['labels'] == {'experiment': 'test'}
+    other = Result.from_body(json.loads(json.dumps(body)), compact=True)
+    assert other.meta['labels']['experiment'] is \
+        result.meta['labels']['experiment']
+    assert result.meta['ownerReferences'][0]['uid'] == 'abc'
+
+    del body['metadata']['managedFields']
+    assert result.to_body() == Result.from_body(body).to_body()
+    # Models keep identity hashing, e.g. as dict keys.
+    assert len({result, Result.from_body(body)}) == 2
+
+
+def test_continuation_lineage():
+    exp = Experiment('test', {}, meta={'uid': 'abc'})
+    first = exp.result_for('test-1', {'epochs': 10})
+    first.record_values({'step-10': {'loss': 0.5}})
+    first.record_checkpoint('/checkpoints/test-1')
+    second = exp.result_for('test-2', {'epochs': 20}, parent=first.name)
+    second.record_values({'step-20': {'loss': 0.25}})
+
+    assert second.parent() == 'test-1'
+    assert Result.from_body(second.to_body()).parent() == 'test-1'
+    assert stitch_values([first, second]) == {
+        'step-10': {'loss': 0.5}, 'step-20': {'loss': 0.25}}
+
+
+def test_latest_step():
+    values = {'step-2': {'loss': 0.5}, 'step-10': {'loss': 0.1},
+              'fitness': 0.3}
+    assert latest_step(values) == ({'loss': 0.1}, 2)
+    assert latest_step({}) == (None, 0)
+    result = Result('test-1', 'test', 'abc', status={'values': values})
+    assert result.latest_step() == ({'loss': 0.1}, 2)
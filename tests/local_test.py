@@ -0,0 +1,134 @@
+from kubernetes import client as k8sclient
+from lib import local
+from lib.exp import API, API_VERSION, RESULTS, Client, Experiment
+from lib.local import LocalObjectStore
+from lib.retention import finished_at
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Records the job's parameter and name in its result, like job.py does.
+JOB = '''
+import os
+from lib.exp import Client
+c = Client(os.environ['EXPERIMENT_NAMESPACE'])
+exp = c.current_experiment()
+result = c.current_result(exp)
+result.record_values({'x': int(os.environ['PARAMETER_X_INT']),
+                      'job': os.environ['JOB_NAME']})
+c.create_result(result)
+'''
+
+
+def test_local_object_store():
+    store = LocalObjectStore(tempfile.mkdtemp())
+
+    def body(name, experiment):
+        return {'metadata': {'name': name,
+                             'labels': {'experiment': experiment}}}
+
+    store.create_namespaced_custom_object(
+        API, API_VERSION, 'ns', RESULTS, body('a', 'foo'))
+    store.create_namespaced_custom_object(
+        API, API_VERSION, 'ns', RESULTS, body('b', 'bar'))
+
+    try:
+        store.create_namespaced_custom_object(
+            API, API_VERSION, 'ns', RESULTS, body('a', 'foo'))
+        assert False, 'expected AlreadyExists'
+    except k8sclient.rest.ApiException as e:
+        assert json.loads(e.body)['reason'] == 'AlreadyExists'
+
+    listed = store.list_namespaced_custom_object(
+        API, API_VERSION, 'ns', RESULTS, label_selector='experiment=bar')
+    assert [item['metadata']['name'] for item in listed['items']] == ['b']
+
+    a = store.get_namespaced_custom_object(
+        API, API_VERSION, 'ns', RESULTS, 'a')
+    a['status'] = {'values': {'fitness': 0.5}}
+    store.replace_namespaced_custom_object(
+        API, API_VERSION, 'ns', RESULTS, 'a', a)
+    a = store.get_namespaced_custom_object(
+        API, API_VERSION, 'ns', RESULTS, 'a')
+    assert a['status']['values']['fitness'] == 0.5
+    assert a['metadata']['resourceVersion'] == '2'
+
+
+# Yields a local backend client whose jobs can import lib, restoring the
+# environment afterwards.
+@contextlib.contextmanager
+def local_client(max_workers):
+    root = tempfile.mkdtemp()
+    saved = dict(os.environ)
+    os.environ['EXPERIMENT_LOCAL_ROOT'] = root
+    os.environ['PYTHONPATH'] = ROOT
+    os.environ.pop('RESULT_STORE', None)
+    try:
+        local.executor(root, max_workers=max_workers)
+        yield Client('ns', backend='local')
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+def experiment(c, name, command, backoff_limit=0):
+    return c.create_experiment(Experiment(name, {
+        'backoffLimit': backoff_limit,
+        'template': {'spec': {
+            'restartPolicy': 'Never',
+            'containers': [{'name': 'main', 'image': 'local',
+                            'command': command}]}}
+    }, {'x': [1, 2]}))
+
+
+def test_local_executor_runs_jobs():
+    with local_client(max_workers=1) as c:
+        exp = experiment(c, 'run', [sys.executable, '-c', JOB])
+        first = c.create_job(exp, {'x': 1})
+        second = c.create_job(exp, {'x': 2})
+        c.batch.wait()
+
+        jobs = dict((job.metadata.name, job) for job in c.list_jobs(exp))
+        assert all(job.status.succeeded == 1 for job in jobs.values())
+        # With one worker, the second job starts once the first is done.
+        assert jobs[second.metadata.name].status.start_time >= \
+            finished_at(jobs[first.metadata.name])
+
+        result = c.get_result(first.metadata.name)
+        assert result.values() == {'x': 1, 'job': first.metadata.name}
+        assert result.job_parameters() == {'x': 1}
+        assert len(c.list_results(exp)) == 2
+
+
+def test_local_executor_honours_backoff_limit():
+    with local_client(max_workers=1) as c:
+        exp = experiment(c, 'fail', ['sh', '-c', 'exit 3'], backoff_limit=1)
+        job = c.create_job(exp, {'x': 1})
+        c.batch.wait()
+
+        job = c.get_job(job.metadata.name)
+        assert job.status.failed == 2 and not job.status.succeeded
+        assert [(condition.type, condition.reason)
+                for condition in job.status.conditions] == [
+                    ('Failed', 'BackoffLimitExceeded')]
+
+
+def test_local_executor_terminates_deleted_jobs():
+    with local_client(max_workers=1) as c:
+        exp = experiment(c, 'sleep', ['sleep', '60'])
+        job = c.create_job(exp, {'x': 1})
+        while c.get_job(job.metadata.name).status.active is None:
+            time.sleep(0.05)
+        time.sleep(0.2)
+
+        start = time.time()
+        c.delete_job(job.metadata.name)
+        c.batch.wait()
+        assert time.time() - start < 10
+        assert c.list_jobs(exp) == []
@@ -0,0 +1,76 @@
+from lib.exp import Result
+from lib.pareto import (ParetoFront, non_dominated, non_dominated_sort,
+                        parse_objectives, prioritize)
+from lib.space import ParameterSpace
+import numpy as np
+
+
+def brute_force_front(costs):
+    front = []
+    for i, a in enumerate(costs):
+        if not any(np.all(b <= a) and np.any(b < a) for b in costs):
+            front.append(i)
+    return front
+
+
+def result(name, parameters, values):
+    return Result(name, 'test', 'uid', status={
+        'job_parameters': parameters, 'values': values})
+
+
+def test_non_dominated_matches_brute_force():
+    costs = np.random.RandomState(0).randint(0, 20, size=(600, 3))
+    mask = non_dominated(costs, workers=4)
+    assert list(np.flatnonzero(mask)) == brute_force_front(costs)
+
+
+def test_non_dominated_sort():
+    costs = [[1, 4], [2, 2], [4, 1], [2, 4], [3, 3], [5, 5]]
+    assert list(non_dominated_sort(costs)) == [0, 0, 0, 1, 1, 2]
+
+
+def test_incremental_front_matches_batch():
+    objectives = parse_objectives('accuracy:max,latency:min')
+    assert objectives == [('accuracy', 'max'), ('latency', 'min')]
+    rng = np.random.RandomState(1)
+    results = [result('job-{}'.format(i), {}, {
+        'accuracy': float(rng.rand()), 'latency': float(rng.rand())})
+        for i in range(200)]
+    front = ParetoFront(objectives)
+    for start in range(0, len(results), 7):
+        front.update(results[start:start + 7])
+    costs = np.array([[-r.values()['accuracy'], r.values()['latency']]
+                      for r in results])
+    expected = set(results[i].name for i in brute_force_front(costs))
+    assert set(r.name for r in front.front()) == expected
+
+    # A result on the front regressing exposes the results it dominated.
+    best = front.front()[0]
+    front.update([result(best.name, {}, {'accuracy': -1.0, 'latency': 2.0})])
+    costs[int(best.name.split('-')[1])] = [1.0, 2.0]
+    expected = set(results[i].name for i in brute_force_front(costs))
+    assert set(r.name for r in front.front()) == expected
+
+
+def test_front_uses_latest_step():
+    front = ParetoFront([('loss', 'min')]).update([
+        result('a', {}, {'step-1': {'loss': 0.1}, 'step-2': {'loss': 0.9}}),
+        result('b', {}, {'step-1': {'loss': 0.5}}),
+        result('c', {}, {})])
+    assert [r.name for r in front.front()] == ['b']
+    assert front.values().tolist() == [[0.5]]
+
+
+def test_prioritize_nearest_first():
+    space = ParameterSpace({
+        'lr': [0.1, 0.2, 0.3, 0.4, 0.5],
+        'optimizer': ['sgd', 'adam'],
+        'momentum': {'values': [0.9], 'when': "optimizer == 'sgd'"}
+    })
+    front = [result('a', {'lr': 0.5, 'optimizer': 'adam'}, {})]
+    points = [{'lr': 0.1, 'optimizer': 'adam'},
+              {'lr': 0.5, 'optimizer': 'sgd', 'momentum': 0.9},
+              {'lr': 0.4, 'optimizer': 'adam'}]
+    assert prioritize(points, front, space) == [points[2], points[0],
+                                                points[1]]
+    assert prioritize(points, [], space) == points
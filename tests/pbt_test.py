@@ -0,0 +1,221 @@
+from datetime import datetime, timedelta, timezone
+from kubernetes import client as k8sclient
+from lib.exp import Experiment, Result
+from lib.fanout import FanoutClient, Target
+from lib.pbt import PopulationBasedTraining
+import json
+import os
+import tempfile
+
+
+PARAMETERS = {'lr': [0.01, 0.1], 'batch_size': [32, 64]}
+
+
+def test_explore_stays_in_the_space():
+    exp = Experiment('test', {}, {
+        'lr': [0.01, 0.1],
+        'batch_size': [32, 64],
+        'optimizer': ['sgd', 'adam'],
+        'momentum': {'values': [0.9], 'when': "optimizer == 'sgd'"}
+    }, constraints=['lr < 0.2'])
+    pbt = PopulationBasedTraining(None, exp, 'loss', seed=0,
+                                  resample_probability=1.0)
+    for _ in range(20):
+        point = pbt.explore({'lr': 0.1, 'batch_size': 64,
+                             'optimizer': 'sgd', 'momentum': 0.9})
+        assert pbt.space.admits(point)
+        assert isinstance(point['batch_size'], int)
+
+
+# Keeps jobs and results in memory. Tests record results and finish jobs
+# with `report` and `finish`.
+class FakeClient(object):
+    def __init__(self, prefix='job'):
+        self.prefix = prefix
+        self.jobs = {}
+        self.results = {}
+        self.parents = {}
+        self.deleted = []
+        self.pods = []
+
+    def list_experiments(self):
+        return [Experiment('test', {}, PARAMETERS, meta={'uid': 'abc'})]
+
+    def create_job(self, experiment, parameters, parent=None):
+        name = '{}-{}'.format(self.prefix, len(self.parents))
+        self.jobs[name] = k8sclient.V1Job(
+            metadata=k8sclient.V1ObjectMeta(name=name, annotations={
+                'job_parameters': json.dumps(parameters)}),
+            status=k8sclient.V1JobStatus())
+        self.parents[name] = parent
+        return self.jobs[name]
+
+    def delete_job(self, name):
+        self.deleted.append(name)
+        del self.jobs[name]
+
+    def list_jobs(self, experiment):
+        return list(self.jobs.values())
+
+    def list_pods(self, experiment):
+        return self.pods
+
+    def list_results(self, experiment=None, compact=False):
+        return list(self.results.values())
+
+    def get_result(self, name):
+        return self.results[name]
+
+    def report(self, name, accuracies, checkpoint=None):
+        result = Result(name, 'test', 'abc')
+        result.record_values(dict(
+            ('step-{}'.format(step), {'accuracy': accuracy})
+            for step, accuracy in enumerate(accuracies)))
+        if checkpoint is not None:
+            result.record_checkpoint(checkpoint)
+        self.results[name] = result
+        return result
+
+    def finish(self, name):
+        now = datetime.now(timezone.utc)
+        self.jobs[name].status = k8sclient.V1JobStatus(
+            succeeded=1, completion_time=now)
+
+
+def checkpoint(directory, name, content):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write(content)
+    return path
+
+
+def test_pbt_through_fanout():
+    directory = tempfile.mkdtemp()
+    targets = [Target('a', client=FakeClient('a')),
+               Target('b', client=FakeClient('b'))]
+    fanout = FanoutClient(targets, refresh_interval=3600)
+    exp = Experiment('test', {}, PARAMETERS, meta={'uid': 'abc'})
+    pbt = PopulationBasedTraining(fanout, exp, 'accuracy', population=2,
+                                  ready_steps=1, seed=0)
+    pbt.start()
+    a, b = targets[0].client, targets[1].client
+    assert list(a.jobs) == ['a-0'] and list(b.jobs) == ['b-0']
+
+    a.report('a-0', [0.5, 0.9], checkpoint(directory, 'a-0', 'a'))
+    b.report('b-0', [0.5, 0.1], checkpoint(directory, 'b-0', 'b'))
+    assert pbt.step()
+
+    # The worse member continues the better one, on the better one's target.
+    assert b.deleted == ['b-0']
+    assert list(a.jobs) == ['a-0', 'a-1']
+    assert a.parents['a-1'].name == 'a-0'
+    assert fanout.get_result('b-0').name == 'b-0'
+
+
+def pbt_with(client, **kwargs):
+    exp = Experiment('test', {}, PARAMETERS, meta={'uid': 'abc'})
+    pbt = PopulationBasedTraining(client, exp, 'accuracy', seed=0, **kwargs)
+    pbt.start()
+    return pbt
+
+
+def test_step_exploits_a_copy_of_the_best_checkpoint():
+    directory = tempfile.mkdtemp()
+    client = FakeClient()
+    pbt = pbt_with(client, population=4, ready_steps=2)
+    best = checkpoint(directory, 'job-0', 'best')
+    client.report('job-0', [0.5, 0.9], best)
+    client.report('job-1', [0.5, 0.6], checkpoint(directory, 'job-1', '1'))
+    client.report('job-2', [0.5, 0.4], checkpoint(directory, 'job-2', '2'))
+    client.report('job-3', [0.5, 0.2], checkpoint(directory, 'job-3', '3'))
+    assert pbt.step()
+
+    # Only the bottom quarter is replaced, from a copy of the best
+    # checkpoint.
+    assert client.deleted == ['job-3']
+    parent = client.parents['job-4']
+    assert parent.name == 'job-0'
+    assert parent.checkpoint() != best
+    with open(parent.checkpoint()) as copied:
+        assert copied.read() == 'best'
+    assert client.results['job-0'].checkpoint() == best
+    assert pbt.members[3].job_name == 'job-4'
+    assert pbt.space.admits(pbt.members[3].parameters)
+
+    # Members decide again only after recording `ready_steps` more steps.
+    assert pbt.step()
+    assert client.deleted == ['job-3']
+
+
+def test_exploit_needs_a_checkpoint_to_copy():
+    client = FakeClient()
+    pbt = pbt_with(client, population=2, ready_steps=1)
+    client.report('job-0', [0.9], '/unreachable/job-0')
+    client.report('job-1', [0.1])
+    assert pbt.step()
+    assert client.deleted == []
+    assert list(client.jobs) == ['job-0', 'job-1']
+
+
+def test_finish_continues_own_checkpoint_until_max_launches():
+    directory = tempfile.mkdtemp()
+    client = FakeClient()
+    pbt = pbt_with(client, population=1, max_launches=2)
+    own = checkpoint(directory, 'job-0', 'own')
+    client.report('job-0', [0.5], own)
+    client.finish('job-0')
+    assert pbt.step()
+
+    # A finished job resumes from its own checkpoint, without a copy.
+    assert client.parents['job-1'].checkpoint() == own
+    assert pbt.members[0].launches == 2
+
+    client.report('job-1', [0.6], own)
+    client.finish('job-1')
+    assert not pbt.step()
+    assert pbt.members[0].done
+    assert list(client.jobs) == ['job-0', 'job-1']
+
+
+def test_step_replaces_jobs_that_disappear():
+    client = FakeClient()
+    pbt = pbt_with(client, population=2, max_launches=2)
+    assert pbt.step()
+    del client.jobs['job-1']
+    assert pbt.step()
+
+    # The member starts over nearby, as nothing recorded a checkpoint.
+    assert pbt.members[1].job_name == 'job-2'
+    assert client.parents['job-2'] is None
+    assert client.deleted == []
+
+    # A job counts as gone only once it has been listed.
+    assert pbt.step()
+    del client.jobs['job-2']
+    assert pbt.step()
+    assert pbt.members[1].done
+
+
+def test_step_replaces_jobs_stuck_pulling_their_image():
+    client = FakeClient()
+    pbt = pbt_with(client, population=2)
+    client.report('job-0', [0.9],
+                  checkpoint(tempfile.mkdtemp(), 'job-0', 'best'))
+    client.pods = [k8sclient.V1Pod(
+        metadata=k8sclient.V1ObjectMeta(
+            name='job-1-pod', labels={'job-name': 'job-1'},
+            creation_timestamp=datetime.now(timezone.utc) -
+            timedelta(hours=1)),
+        status=k8sclient.V1PodStatus(
+            phase='Pending',
+            container_statuses=[k8sclient.V1ContainerStatus(
+                name='main', image='main', image_id='', ready=False,
+                restart_count=0, state=k8sclient.V1ContainerState(
+                    waiting=k8sclient.V1ContainerStateWaiting(
+                        reason='ImagePullBackOff')))]))]
+    assert pbt.step()
+
+    # The stuck job is stopped and the member continues the best one.
+    assert client.deleted == ['job-1']
+    assert pbt.members[1].job_name == 'job-2'
+    assert client.parents['job-2'].name == 'job-0'
@@ -0,0 +1,52 @@
+from lib import ratelimit
+from lib.ratelimit import PriorityRateLimiter, TokenBucket
+import threading
+import time
+
+
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(2, 2, clock=lambda: now[0])
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert bucket.take() == 0.5
+    now[0] = 0.5
+    assert bucket.take() == 0
+    # Refills never exceed the burst.
+    now[0] = 100
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0.5]
+
+
+def test_limiter_serves_urgent_requests_first():
+    limiter = PriorityRateLimiter(10, 1)
+    limiter.acquire(ratelimit.LIST)
+    order = []
+
+    def request(priority):
+        limiter.acquire(priority)
+        order.append(priority)
+
+    threads = []
+    for priority in (ratelimit.LIST, ratelimit.GET, ratelimit.WRITE_RESULT):
+        thread = threading.Thread(target=request, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        # Queue every request before the next token arrives.
+        while limiter.queue_depth() < len(threads):
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+
+    assert order == [ratelimit.WRITE_RESULT, ratelimit.GET, ratelimit.LIST]
+    stats = limiter.stats()
+    assert stats['list']['requests'] == 2
+    assert stats['write_result']['requests'] == 1
+    assert stats['get']['waiting'] == 0
+    assert stats['get']['max_wait_seconds'] > 0
+
+
+def test_limiter_disabled():
+    limiter = PriorityRateLimiter(0, 1)
+    for _ in range(100):
+        assert limiter.acquire(ratelimit.LIST) < 0.1
+    assert limiter.stats()['list']['requests'] == 100
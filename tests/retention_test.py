@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta, timezone
+from kubernetes import client as k8sclient
+from lib.exp import Experiment, Result
+from lib import retention
+from lib.retention import (archive_results, bulk_delete, collect_garbage,
+                           expired_jobs)
+import json
+import os
+import tempfile
+
+
+NOW = datetime(2018, 6, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def job(name, completed=None, failed=None):
+    conditions = []
+    if failed is not None:
+        conditions.append(k8sclient.V1JobCondition(
+            type='Failed', status='True', last_transition_time=failed))
+    return k8sclient.V1Job(
+        metadata=k8sclient.V1ObjectMeta(name=name),
+        status=k8sclient.V1JobStatus(completion_time=completed,
+                                     conditions=conditions))
+
+
+def test_expired_jobs():
+    jobs = [
+        job('running'),
+        job('recent', completed=NOW - timedelta(seconds=10)),
+        job('old', completed=NOW - timedelta(hours=2)),
+        job('old-failed', failed=NOW - timedelta(hours=2))
+    ]
+    expired = expired_jobs(jobs, 3600, now=NOW)
+    assert [j.metadata.name for j in expired] == ['old', 'old-failed']
+
+
+def test_archive_results():
+    exp = Experiment('test', {}, meta={'uid': 'abc'})
+    result = Result('test-1', 'test', 'abc',
+                    status={'job_parameters': {'x': 1}})
+    result.record_values({'fitness': 0.5})
+    result.record_values({'step-1': {'loss': 0.9}, 'step-2': {'loss': 0.4},
+                          'history': [0.9, 0.4]})
+    archive_results(exp, [result])
+    assert exp.status['archive'] == {
+        'test-1': {'job_parameters': {'x': 1},
+                   'values': {'fitness': 0.5, 'loss': 0.4, 'steps': 2}}
+    }
+
+
+def test_bulk_delete_reports_failures():
+    deleted = []
+
+    def delete(name):
+        if name == 'b':
+            raise Exception('boom')
+        deleted.append(name)
+
+    assert bulk_delete(delete, ['a', 'b', 'c'], max_workers=2) == ['b']
+    assert sorted(deleted) == ['a', 'c']
+
+
+class FakeClient(object):
+    def __init__(self, exp, jobs, results):
+        self.exp = exp
+        self.jobs = dict((j.metadata.name, j) for j in jobs)
+        self.results = dict((r.name, r) for r in results)
+
+    def list_jobs(self, experiment):
+        return list(self.jobs.values())
+
+    def list_results(self, experiment=None, compact=False):
+        return list(self.results.values())
+
+    def get_experiment(self, name):
+        return Experiment.from_body(json.loads(json.dumps(
+            self.exp.to_body())))
+
+    def update_experiment(self, exp):
+        self.exp = exp
+        return exp
+
+    def delete_result(self, name):
+        del self.results[name]
+
+    def delete_job(self, name):
+        del self.jobs[name]
+
+
+def result(exp, name, parent=None, created=None):
+    r = exp.result_for(name, {'x': 1}, parent=parent)
+    if created is not None:
+        r.meta['creationTimestamp'] = created.strftime('%Y-%m-%dT%H:%M:%SZ')
+    r.record_values({'step-1': {'loss': 0.5}})
+    return r
+
+
+def test_collect_garbage():
+    exp = Experiment('test', {}, meta={'uid': 'abc'})
+    old = datetime.now(timezone.utc) - timedelta(hours=2)
+    client = FakeClient(exp, [job('old', completed=old), job('running')],
+                        [result(exp, 'old'), result(exp, 'running')])
+
+    assert collect_garbage(client, exp, 3600) == ['old']
+    assert list(client.jobs) == ['running']
+    assert list(client.results) == ['running']
+    assert client.exp.status['archive'] == {'old': {
+        'job_parameters': {'x': 1}, 'values': {'loss': 0.5, 'steps': 1}}}
+
+
+def test_collect_garbage_archives_to_file_when_status_is_full():
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    max_bytes = retention.MAX_STATUS_ARCHIVE_BYTES
+    os.chdir(directory)
+    retention.MAX_STATUS_ARCHIVE_BYTES = 10
+    try:
+        exp = Experiment('test', {}, meta={'uid': 'abc'})
+        old = datetime.now(timezone.utc) - timedelta(hours=2)
+        client = FakeClient(exp, [job('old', completed=old)],
+                            [result(exp, 'old')])
+        assert collect_garbage(client, exp, 3600) == ['old']
+    finally:
+        os.chdir(cwd)
+        retention.MAX_STATUS_ARCHIVE_BYTES = max_bytes
+
+    assert 'archive' not in client.exp.status
+    with open(os.path.join(directory, 'test-archive.jsonl')) as archive:
+        assert json.loads(archive.read())['result'] == 'old'
+    assert not client.jobs and not client.results
+
+
+def test_collect_garbage_keeps_lineages_whole():
+    exp = Experiment('test', {}, meta={'uid': 'abc'})
+    old = datetime.now(timezone.utc) - timedelta(hours=2)
+    client = FakeClient(
+        exp,
+        [job('grandparent', completed=old), job('parent', completed=old),
+         job('child')],
+        [result(exp, 'grandparent'),
+         result(exp, 'parent', parent='grandparent'),
+         result(exp, 'child', parent='parent')])
+
+    # The running child keeps its whole lineage, jobs included.
+    assert collect_garbage(client, exp, 3600) == []
+    assert sorted(client.jobs) == ['child', 'grandparent', 'parent']
+    assert sorted(client.results) == ['child', 'grandparent', 'parent']
+
+    # Once the child expires too, the lineage is collected together.
+    client.jobs['child'] = job('child', completed=old)
+    assert collect_garbage(client, exp, 3600) == [
+        'child', 'grandparent', 'parent']
+    assert not client.jobs and not client.results
+    assert sorted(client.exp.status['archive']) == [
+        'child', 'grandparent', 'parent']
+
+
+def test_collect_garbage_collects_expired_orphaned_results():
+    exp = Experiment('test', {}, meta={'uid': 'abc'})
+    now = datetime.now(timezone.utc)
+    # The job of a recent result may run in another cluster.
+    client = FakeClient(exp, [], [
+        result(exp, 'old', created=now - timedelta(hours=2)),
+        result(exp, 'recent', created=now - timedelta(minutes=1)),
+        result(exp, 'unknown')])
+    assert collect_garbage(client, exp, 3600) == []
+    assert sorted(client.results) == ['recent', 'unknown']
+    assert sorted(client.exp.status['archive']) == ['old']
@@ -0,0 +1,56 @@
+from lib.space import ParameterSpace
+
+
+def test_unconstrained_space_is_the_full_grid():
+    space = ParameterSpace({'x': [1, 2, 3], 'y': [True, False]})
+    assert space.count() == 6
+    assert list(space.points())[:2] == [{'x': 1, 'y': True},
+                                        {'x': 1, 'y': False}]
+
+
+def test_conditional_parameters():
+    space = ParameterSpace({
+        'momentum': {'values': [0.5, 0.9], 'when': "optimizer == 'sgd'"},
+        'optimizer': ['sgd', 'adam']
+    })
+    assert list(space.points()) == [
+        {'optimizer': 'sgd', 'momentum': 0.5},
+        {'optimizer': 'sgd', 'momentum': 0.9},
+        {'optimizer': 'adam'}
+    ]
+
+
+def test_constraints_prune_points():
+    space = ParameterSpace(
+        {'batch_size': [32, 64, 128], 'model_size': [1, 2, 4],
+         'nesterov': {'values': [True, False], 'when': 'model_size > 1'}},
+        constraints=['batch_size * model_size <= 128',
+                     'not nesterov or batch_size == 32'])
+    points = list(space.points())
+    assert space.count() == len(points) == 8
+    assert all(p['batch_size'] * p['model_size'] <= 128 for p in points)
+    assert {'batch_size': 32, 'model_size': 1} in points
+
+
+def test_invalid_specs_are_rejected():
+    for parameters, constraints in [
+            ({'x': [1]}, ['y > 1']),
+            ({'x': {'values': [1], 'when': 'y'},
+              'y': {'values': [1], 'when': 'x'}}, []),
+            ({'x': [1]}, ['__import__("os")'])]:
+        try:
+            ParameterSpace(parameters, constraints)
+            assert False, 'expected an exception'
+        except Exception as e:
+            assert 'expected' not in str(e)
+
+
+def test_exponents_are_bounded():
+    space = ParameterSpace({'x': [10]}, constraints=['x ** 2 == 100'])
+    assert space.count() == 1
+    space = ParameterSpace({'x': [10]}, constraints=['x ** 10 ** 10 > 1'])
+    try:
+        space.count()
+        assert False, 'expected an exception'
+    except Exception as e:
+        assert 'Exponent' in str(e)
@@ -0,0 +1,140 @@
+from kubernetes import client as k8sclient
+from lib import store
+from lib.exp import Client, Experiment
+from lib.store import (ResultStore, ResultStoreHandler, ResultStoreServer,
+                       database)
+import copy
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+
+def check_store(c):
+    exp = Experiment('test', {}, meta={'uid': 'abc'})
+    other = Experiment('other', {}, meta={'uid': 'def'})
+
+    result = c.create_result(exp.result_for('test-1', {'x': 1}))
+    result.record_values({'step-1': {'accuracy': 0.5, 'loss': 2.0}})
+    result = c.update_result(result)
+    result.record_values({'step-2': {'accuracy': 0.75, 'loss': 1.0}})
+    c.update_result(result)
+    c.create_result(other.result_for('other-1', {'x': 2}))
+    c.update_result(other.result_for('other-1', {'x': 2}))
+
+    try:
+        c.create_result(exp.result_for('test-1', {'x': 1}))
+        assert False, 'expected AlreadyExists'
+    except k8sclient.rest.ApiException as e:
+        assert json.loads(e.body)['reason'] == 'AlreadyExists'
+
+    assert c.get_result('test-1').values()['step-2']['accuracy'] == 0.75
+    assert [r.name for r in c.list_results(exp)] == ['test-1']
+    assert len(c.list_results()) == 2
+    assert c.store.best_values('accuracy') == {'test': 0.75}
+    assert c.store.best_values('loss', mode='min') == {'test': 1.0}
+
+    c.delete_result('test-1')
+    assert c.store.best_values('accuracy') == {}
+
+
+def test_sqlite_store():
+    path = os.path.join(tempfile.mkdtemp(), 'results.db')
+    check_store(Client('ns', store_url='sqlite://' + path))
+
+
+def test_sqlite_store_url_is_absolute():
+    c = Client('ns', store_url='sqlite://results.db')
+    assert c.store_url == 'sqlite://' + os.path.abspath('results.db')
+
+
+def test_http_store():
+    path = os.path.join(tempfile.mkdtemp(), 'results.db')
+    handler = type('Handler', (ResultStoreHandler,),
+                   {'database': database(path)})
+    server = ResultStoreServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        check_store(Client('ns', store_url='http://127.0.0.1:{}'.format(
+            server.server_address[1])))
+    finally:
+        server.shutdown()
+
+
+def test_sqlite_metric_cache_is_bounded():
+    max_cached = store.MAX_CACHED_RESULTS
+    store.MAX_CACHED_RESULTS = 2
+    try:
+        path = os.path.join(tempfile.mkdtemp(), 'results.db')
+        c = Client('ns', store_url='sqlite://' + path)
+        exp = Experiment('test', {}, meta={'uid': 'abc'})
+        results = []
+        for i in range(5):
+            result = exp.result_for('test-{}'.format(i), {'x': i})
+            result.record_values({'step-1': {'loss': 10.0 + i, 'extra': 1.0}})
+            results.append(c.create_result(result))
+        assert len(c.store.database._written) == 2
+
+        # Forgotten rows are read back, so stale metrics are still removed.
+        results[0].status['values'] = {'step-1': {'loss': 1.0}}
+        c.update_result(results[0])
+        assert c.store.best_values('loss', mode='min') == {'test': 1.0}
+        assert len(c.store.database.read(
+            "SELECT * FROM metrics WHERE result = 'test-0'")) == 1
+        assert len(c.store.database._written) == 2
+    finally:
+        store.MAX_CACHED_RESULTS = max_cached
+
+
+def test_result_store_is_abstract():
+    try:
+        ResultStore(None)
+        assert False, 'expected TypeError'
+    except TypeError:
+        pass
+
+
+# Fails the next COMMIT of the writer thread once `fail_commit` is set.
+class FlakyDatabase(store.SQLiteDatabase):
+    fail_commit = False
+
+    def _connection(self):
+        database = self
+        connection = super(FlakyDatabase, self)._connection()
+
+        class Connection(object):
+            def __getattr__(self, name):
+                return getattr(connection, name)
+
+            def execute(self, sql, *args):
+                if sql == 'COMMIT' and database.fail_commit:
+                    database.fail_commit = False
+                    raise sqlite3.OperationalError('disk I/O error')
+                return connection.execute(sql, *args)
+        return Connection()
+
+
+def test_sqlite_survives_failed_commit():
+    db = FlakyDatabase(os.path.join(tempfile.mkdtemp(), 'results.db'))
+    exp = Experiment('test', {}, meta={'uid': 'abc'})
+    body = exp.result_for('test-1', {'x': 1}).to_body()
+    body['status'] = {'values': {'loss': 1.0}}
+    db.create('ns', copy.deepcopy(body))
+
+    db.fail_commit = True
+    body['status'] = {'values': {'loss': 0.5}}
+    try:
+        db.replace('ns', 'test-1', copy.deepcopy(body))
+        assert False, 'expected OperationalError'
+    except sqlite3.OperationalError:
+        pass
+    assert db.best_values('ns', 'loss', mode='min') == {'test': 1.0}
+
+    # The writer is still running, and writes the rolled back rows again.
+    done = threading.Event()
+    threading.Thread(target=lambda: (
+        db.replace('ns', 'test-1', copy.deepcopy(body)), done.set()),
+        daemon=True).start()
+    assert done.wait(5)
+    assert db.best_values('ns', 'loss', mode='min') == {'test': 0.5}